@@ -0,0 +1,45 @@
+# file: bench_argparse.py
+# description: Measures ArgumentParser.parse_known_args for commands with 1, 10 and 50 options
+# usage: run from the repository root, e.g. `micropython benchmarks/bench_argparse.py`
+
+import sys
+sys.path.insert(0, 'clivia')
+
+from argparse import ArgumentParser
+
+from compat import ticks_us, ticks_diff
+
+ROUNDS = 2000
+OPTION_COUNTS = (1, 10, 50)
+
+def make_parser(count):
+    p = ArgumentParser(prog='cmd%d' % count)
+    p.add_argument('target')
+    for i in range(count):
+        p.add_argument('-o%d' % i, '--option-%d' % i, type=int, default=0)
+    return p
+
+def bench(count):
+    p = make_parser(count)
+    words = ['target']
+    for i in range(count):
+        words.append('--option-%d' % i)
+        words.append(str(i))
+
+    p.parse_known_args(words) # first parse compiles the parser
+    start = ticks_us()
+    for _ in range(ROUNDS):
+        p.parse_known_args(words)
+    all_given = ticks_diff(ticks_us(), start) / ROUNDS
+
+    start = ticks_us()
+    for _ in range(ROUNDS):
+        p.parse_known_args(['target', '-o0', '1'])
+    one_given = ticks_diff(ticks_us(), start) / ROUNDS
+    return all_given, one_given
+
+if __name__ == '__main__':
+    print('options  all_given_us  one_given_us')
+    for count in OPTION_COUNTS:
+        all_given, one_given = bench(count)
+        print('%7d  %12.2f  %12.2f' % (count, all_given, one_given))
@@ -0,0 +1,63 @@
+# file: bench_gc.py
+# description: Counts garbage collections (and on MicroPython bytes allocated) per 1000 commands received by a session,
+#              with lines passed on as memoryview slices of the receive buffer or decoded to str first
+# usage: run from the repository root, e.g. `micropython benchmarks/bench_gc.py`
+
+import gc
+import harness
+
+from clivia import CliviaSession
+from harness import MemoryStream, NullStream, make_cli
+
+COMMANDS = 1000
+THRESHOLD = 4096 # MicroPython: collect after this many bytes, like a busy board with a small heap
+LINES = (b'led 1\n', b'led 0 -v\n', b'status -q\n', b"status --name 'board 1'\n")
+
+
+def collections():
+    if harness.MICROPYTHON:
+        return 0
+    return sum(generation['collections'] for generation in gc.get_stats())
+
+def run(cli, session, decode, cached):
+    # what Clivia.loop does for one session, returns collections and bytes allocated (MicroPython only)
+    allocated = 0
+    collected = 0
+    start = collections()
+    last = gc.mem_alloc() if harness.MICROPYTHON else 0
+    for i in range(COMMANDS):
+        if not cached:
+            cli.parse_cache.clear()
+        session.stdin.feed(LINES[i % len(LINES)])
+        for line in session.receive():
+            cli.execute_input(str(line, 'utf-8') if decode else line, session)
+        if harness.MICROPYTHON:
+            now = gc.mem_alloc()
+            if now < last: # heap shrank: a collection ran
+                collected += 1
+            else:
+                allocated += now - last
+            last = now
+    return collected + collections() - start, allocated
+
+def bench(decode, cached):
+    cli = make_cli()
+    session = CliviaSession('bench', MemoryStream(), NullStream())
+    run(cli, session, decode, cached) # warm up caches and buffers
+    gc.collect()
+    if harness.MICROPYTHON:
+        gc.threshold(THRESHOLD)
+    collected, allocated = run(cli, session, decode, cached)
+    if harness.MICROPYTHON:
+        gc.threshold(-1)
+    return collected, allocated
+
+if __name__ == '__main__':
+    if not harness.MICROPYTHON:
+        print('CPython frees most objects by reference counting, run on MicroPython for meaningful numbers')
+    print('lines       cache  gc/%d_commands  bytes/command' % COMMANDS)
+    for cached in (True, False):
+        for decode in (True, False):
+            collected, allocated = bench(decode, cached)
+            print('%-10s  %5s  %16d  %13s' % ('str' if decode else 'memoryview', 'on' if cached else 'off', collected,
+                                              '%d' % (allocated // COMMANDS) if harness.MICROPYTHON else '-'))
@@ -0,0 +1,81 @@
+# file: bench_lexer.py
+# description: Checks lexer.split against shlex.split on a corpus of command lines and compares their speed
+# usage: run from the repository root, e.g. `micropython benchmarks/bench_lexer.py`
+
+import sys
+sys.path.insert(0, 'clivia')
+
+import lexer
+import shlex
+
+from compat import ticks_us, ticks_diff
+
+ROUNDS = 2000
+
+CORPUS = (
+    '',
+    '   ',
+    'led 1',
+    'led 1 -v',
+    'welcome -q\r\n',
+    'led\t1\t-v\n',
+    'user-command -v > tcps/192.168.0.10',
+    'user-command -v >tcps/192.168.0.10',
+    '~session-new usb2 --echo',
+    'say "hello world" -n 3',
+    "say 'hello world' -n 3",
+    'say "it\'s" \'a "quote"\'',
+    'say hello\\ world',
+    'say "a\\"b" "a\\\\b" "a\\nb"',
+    "say 'a\\nb'",
+    'say ""',
+    "say ''",
+    'say a""b c\'\'d',
+    'say "multi word"suffix prefix"multi word"',
+    'path /mnt/uart/0 --mode=rw',
+    'echo \\> not-a-redirect',
+    'zażółć "gęślą jaźń"',
+    'log dump --since 10 --level warning --filter "sensor read" > file/log0',
+    'cfg set -a 1 -b 2 -c 3 -d 4 -e 5 -f 6 -g 7 -h 8 -i 9 -j 10',
+)
+
+INVALID = (
+    'say "unterminated',
+    "say 'unterminated",
+    'say trailing\\',
+    'say "trailing\\',
+)
+
+def check():
+    for line in CORPUS:
+        expected = shlex.split(line)
+        got = lexer.split(line)
+        assert got == expected, (line, expected, got)
+        assert lexer.split(line.encode('utf-8')) == expected, line
+    for line in INVALID:
+        try:
+            shlex.split(line)
+        except ValueError as exc:
+            expected = str(exc)
+        try:
+            lexer.split(line)
+            got = None
+        except ValueError as exc:
+            got = str(exc)
+        assert got == expected, (line, expected, got)
+
+def bench(split):
+    start = ticks_us()
+    for _ in range(ROUNDS):
+        for line in CORPUS:
+            split(line)
+    return ticks_diff(ticks_us(), start) / (ROUNDS * len(CORPUS))
+
+if __name__ == '__main__':
+    check()
+    print('%d lines match shlex.split' % (len(CORPUS) + len(INVALID)))
+    shlex_us = bench(shlex.split)
+    lexer_us = bench(lexer.split)
+    print('shlex.split  %8.2f us/line' % shlex_us)
+    print('lexer.split  %8.2f us/line' % lexer_us)
+    print('speedup      %8.1fx' % (shlex_us / lexer_us))
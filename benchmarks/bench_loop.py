@@ -0,0 +1,43 @@
+# file: bench_loop.py
+# description: Measures per-tick cost of Clivia.loop as the number of registered sessions grows
+# usage: run from the repository root, e.g. `micropython benchmarks/bench_loop.py`
+
+import harness
+
+from clivia import Clivia, CliviaTCPServerSession
+from harness import ticks_us, ticks_diff
+
+PORT = 5599
+TICKS = 1000
+SESSION_COUNTS = (1, 10, 100, 250)
+
+def bench(count):
+    pairs = harness.socket_pairs(count, PORT)
+    cli = Clivia()
+    for i, (client, conn) in enumerate(pairs):
+        cli.register_session(CliviaTCPServerSession('127.0.0.1', PORT, conn, name=f'tcps/{i}'))
+
+    # nothing readable: pure polling overhead
+    start = ticks_us()
+    for _ in range(TICKS):
+        cli.loop()
+    idle = ticks_diff(ticks_us(), start) / TICKS
+
+    # one session out of many has an (empty) line ready every tick
+    client = pairs[-1][0]
+    start = ticks_us()
+    for _ in range(TICKS):
+        client.send(b'\n')
+        cli.loop()
+    ready = ticks_diff(ticks_us(), start) / TICKS
+
+    cli.__exit__(None, None, None)
+    for client, _ in pairs:
+        client.close()
+    return idle, ready
+
+if __name__ == '__main__':
+    print('sessions  idle_us/tick  one_ready_us/tick')
+    for count in SESSION_COUNTS:
+        idle, ready = bench(count)
+        print('%8d  %12.2f  %17.2f' % (count, idle, ready))
@@ -0,0 +1,28 @@
+# file: bench_parse_cache.py
+# description: Measures Clivia.execute_input for repeated command lines with and without the parse cache
+# usage: run from the repository root, e.g. `micropython benchmarks/bench_parse_cache.py`
+
+import io
+import harness
+
+from clivia import CliviaSession
+from harness import ticks_us, ticks_diff, make_cli
+
+ROUNDS = 2000
+LINES = ('led 1', 'status -q', 'led 0 -v', "status --name 'board 1'")
+
+def bench(cached):
+    cli = make_cli()
+    session = CliviaSession('bench', None, io.BytesIO())
+    start = ticks_us()
+    for i in range(ROUNDS):
+        if not cached:
+            cli.parse_cache.clear()
+        cli.execute_input(LINES[i % len(LINES)], session)
+    return ticks_diff(ticks_us(), start) / ROUNDS, cli.stats['parse_hits'], cli.stats['parse_misses']
+
+if __name__ == '__main__':
+    print('cache  per_line_us   hits  misses')
+    for cached in (False, True):
+        per_line, hits, misses = bench(cached)
+        print('%5s  %11.2f  %5d  %6d' % ('on' if cached else 'off', per_line, hits, misses))
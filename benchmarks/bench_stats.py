@@ -0,0 +1,27 @@
+# file: bench_stats.py
+# description: Measures the cost of ~stats timing instrumentation on Clivia.execute_input
+# usage: run from the repository root, e.g. `micropython benchmarks/bench_stats.py`
+
+import io
+import harness
+
+from clivia import CliviaSession
+from harness import ticks_us, ticks_diff, make_cli
+
+ROUNDS = 2000
+LINES = ('led 1', 'led 0 -v')
+
+def bench(enabled):
+    cli = make_cli()
+    cli.enable_stats(enabled)
+    session = CliviaSession('bench', None, io.BytesIO())
+    start = ticks_us()
+    for i in range(ROUNDS):
+        cli.parse_cache.clear() # every stage is timed
+        cli.execute_input(LINES[i % len(LINES)], session)
+    return ticks_diff(ticks_us(), start) / ROUNDS
+
+if __name__ == '__main__':
+    print('stats  per_line_us')
+    for enabled in (False, True):
+        print('%5s  %11.2f' % ('on' if enabled else 'off', bench(enabled)))
@@ -0,0 +1,125 @@
+# file: bench_suite.py
+# description: Runs the Clivia hot path scenarios on stub streams and prints the results as JSON
+# usage: run from the repository root, e.g. `micropython benchmarks/bench_suite.py > results.json`
+#        (or `python3 ...`), progress goes to stderr; pass scenario names to run only those
+
+import sys
+import harness
+
+import lexer
+import shlex
+from clivia import CliviaSession, CliviaTCPServerSession
+from harness import ticks_us, elapsed_us, MemoryStream, NullStream, make_cli
+
+PORT = 5598
+COMMANDS = 2000
+SESSION_COUNTS = (1, 10, 100, 500)
+ARG_COUNTS = (1, 16, 64)
+OUTPUT_LINES = (1, 10, 100)
+FANOUT_COUNTS = (1, 10, 100)
+
+
+def memory_session(cli, name):
+    # registered like Clivia.register_session, except that a memory stream cannot be polled
+    session = CliviaSession(name, MemoryStream(), NullStream())
+    cli.sessions[name] = session
+    session.out.pending = cli.pending_outputs
+    return session
+
+def run_lines(cli, session, line, count):
+    # what Clivia.loop does for a session with count lines ready, returns us per line
+    data = line.encode('utf-8') + b'\n'
+    start = ticks_us()
+    for _ in range(count):
+        session.stdin.feed(data)
+        for received in session.receive():
+            cli.execute_input(received, session)
+        session.out.flush()
+    return elapsed_us(start) / count
+
+
+def single_session(report):
+    for line in ('led 1', 'led 0 -v', 'say hello'):
+        cli = make_cli()
+        session = memory_session(cli, 'mem/0')
+        per_line = run_lines(cli, session, line, COMMANDS)
+        report.add('single_session', line=line, us_per_command=round(per_line, 2),
+                   commands_per_s=int(1000000 / per_line))
+
+def tcp_sessions(report):
+    # every client sends one command per tick, loop() reads and runs them all
+    for count in SESSION_COUNTS:
+        pairs = harness.socket_pairs(count, PORT)
+        cli = make_cli()
+        for i, (client, conn) in enumerate(pairs):
+            cli.register_session(CliviaTCPServerSession('127.0.0.1', PORT, conn, name='tcps/%d' % i))
+        ticks = max(10, COMMANDS // count)
+        received = 0
+        busy = 0
+        for _ in range(ticks):
+            for client, _ in pairs:
+                client.send(b'say ok\n')
+            start = ticks_us()
+            cli.loop()
+            busy += elapsed_us(start)
+            for client, _ in pairs:
+                received += harness.drain(client)
+        commands = ticks * count
+        report.add('tcp_sessions', sessions=count, commands=commands, us_per_tick=round(busy / ticks, 2),
+                   us_per_command=round(busy / commands, 2), commands_per_s=int(commands * 1000000 / max(busy, 1)),
+                   bytes_received=received)
+        cli.__exit__(None, None, None)
+        for client, _ in pairs:
+            client.close()
+
+def long_arguments(report):
+    for count in ARG_COUNTS:
+        cli = make_cli()
+        session = memory_session(cli, 'mem/0')
+        line = 'args ' + ' '.join('value%d' % i for i in range(count))
+        per_line = run_lines(cli, session, line, COMMANDS // 4)
+        report.add('long_arguments', args=count, line_bytes=len(line), us_per_command=round(per_line, 2))
+
+def tokenizer(report):
+    for line in ('led 1 -v', "say 'hello world' -n 3", 'args ' + ' '.join('value%d' % i for i in range(64))):
+        for name, split in (('shlex.split', shlex.split), ('lexer.split', lexer.split)):
+            rounds = COMMANDS // 4
+            start = ticks_us()
+            for _ in range(rounds):
+                split(line)
+            report.add('tokenizer', split=name, line_bytes=len(line),
+                       us_per_line=round(elapsed_us(start) / rounds, 2))
+
+def heavy_output(report):
+    for lines in OUTPUT_LINES:
+        cli = make_cli()
+        session = memory_session(cli, 'mem/0')
+        per_line = run_lines(cli, session, 'say output-line-of-some-length -n %d' % lines, COMMANDS // 10)
+        report.add('heavy_output', output_lines=lines, us_per_command=round(per_line, 2),
+                   us_per_output_line=round(per_line / lines, 2), bytes_written=session.stdout.written)
+
+def redirect_fanout(report):
+    for count in FANOUT_COUNTS:
+        cli = make_cli()
+        session = memory_session(cli, 'mem/0')
+        targets = [memory_session(cli, 'tgt/%d' % i) for i in range(count)]
+        rounds = COMMANDS // 10
+        start = ticks_us()
+        for _ in range(rounds):
+            cli.execute_input('say broadcast -n 4 > tgt/*', session)
+            for target in targets:
+                target.out.flush()
+        per_line = elapsed_us(start) / rounds
+        report.add('redirect_fanout', targets=count, us_per_command=round(per_line, 2),
+                   us_per_target=round(per_line / count, 2), bytes_written=sum(t.stdout.written for t in targets))
+
+
+SCENARIOS = (single_session, tcp_sessions, long_arguments, tokenizer, heavy_output, redirect_fanout)
+
+if __name__ == '__main__':
+    selected = sys.argv[1:]
+    report = harness.Report()
+    for scenario in SCENARIOS:
+        if not selected or scenario.__name__ in selected:
+            scenario(report)
+    report.dump()
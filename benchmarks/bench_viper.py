@@ -0,0 +1,92 @@
+# file: bench_viper.py
+# description: Checks the viper line framing, word scanning and line comparison of lexer_viper against the
+#              builtin fallbacks of lexer and compares their speed (viper needs MicroPython, e.g. the unix port)
+# usage: run from the repository root, e.g. `micropython benchmarks/bench_viper.py`
+
+import sys
+sys.path.insert(0, 'clivia')
+
+import lexer
+from compat import ticks_us, ticks_diff, array
+
+ROUNDS = 2000
+
+LINES = (
+    b'',
+    b'   ',
+    b'led 1',
+    b'led\t1\t-v\r',
+    b'user-command -v > tcps/192.168.0.10',
+    b'say "hello world" -n 3',
+    b"say 'it' -n 3",
+    b'say hello\\ world',
+    'zażółć gęślą jaźń'.encode('utf-8'),
+    b'cfg set -a 1 -b 2 -c 3 -d 4 -e 5 -f 6 -g 7 -h 8 -i 9 -j 10',
+    ' '.join('w%d' % i for i in range(lexer.MAX_WORDS + 1)).encode('utf-8'),
+)
+
+# receive buffer with several lines and a Ctrl-C, as CliviaSession.receive sees it
+BUFFER = bytearray(b'led 1\nstatus -q\nled 0 -v\npartial\x03cfg set -a 1 -b 2\n' + b'x' * 200)
+
+def frames(line_end, buf):
+    ends = []
+    i = line_end(buf, 0, len(buf))
+    while i < len(buf):
+        ends.append(i)
+        i = line_end(buf, i + 1, len(buf))
+    return ends
+
+def words(line):
+    # words found by the viper scan_words, as split() would give them
+    bounds = array('H', [0] * (2 * lexer.MAX_WORDS))
+    count = lexer.scan_words(line, len(line), bounds, lexer.MAX_WORDS)
+    if count < 0:
+        return count
+    return [str(line[bounds[2 * k]:bounds[2 * k + 1]], 'utf-8') for k in range(count)]
+
+def check():
+    for line in LINES:
+        assert frames(lexer.line_end, line) == frames(lexer._line_end, line), line
+        found = words(line)
+        text = str(line, 'utf-8')
+        if found == -1:
+            assert '"' in text or "'" in text or '\\' in text, line
+        elif found == -2:
+            assert len(text.split()) > lexer.MAX_WORDS, line
+        else:
+            assert found == text.split(), line
+        assert lexer.same(line, line, len(line)) == 1, line
+        assert lexer.line_hash(line, len(line)) == lexer.line_hash(bytes(line), len(line)), line
+    assert frames(lexer.line_end, BUFFER) == frames(lexer._line_end, BUFFER)
+    assert lexer.same(b'led 1', b'led 0', 5) == 0
+
+def bench_frames(line_end):
+    start = ticks_us()
+    for _ in range(ROUNDS):
+        frames(line_end, BUFFER)
+    return ticks_diff(ticks_us(), start) / ROUNDS
+
+def bench_split(scan_words):
+    # what lexer.split does with a line of the receive buffer, viper scan or decode and str.split
+    bounds = array('H', [0] * (2 * lexer.MAX_WORDS))
+    start = ticks_us()
+    for _ in range(ROUNDS):
+        for line in LINES:
+            count = scan_words(line, len(line), bounds, lexer.MAX_WORDS)
+            if count >= 0:
+                [str(line[bounds[2 * k]:bounds[2 * k + 1]], 'utf-8') for k in range(count)]
+            else:
+                str(line, 'utf-8').split()
+    return ticks_diff(ticks_us(), start) / (ROUNDS * len(LINES))
+
+if __name__ == '__main__':
+    variants = [('builtin', lexer._line_end, lexer._scan_words)]
+    if lexer.VIPER:
+        check()
+        print('viper and builtin results match')
+        variants.append(('viper', lexer.line_end, lexer.scan_words))
+    else:
+        print('no viper emitter on %s, timing builtin fallback only' % sys.implementation.name)
+    print('variant  frames_us/buffer  split_us/line')
+    for name, line_end, scan_words in variants:
+        print('%7s  %16.2f  %13.2f' % (name, bench_frames(line_end), bench_split(scan_words)))
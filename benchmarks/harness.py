@@ -0,0 +1,146 @@
+# file: harness.py
+# description: Stub streams, sample commands and reporting shared by the benchmark scenarios
+# usage: `import harness` from scripts in benchmarks/ run from the repository root
+
+import sys
+sys.path.insert(0, 'clivia')
+
+import json
+import socket
+
+from compat import ticks_us, ticks_diff, stream, MICROPYTHON
+from argparse import ArgumentParser
+from clivia import Clivia
+
+
+class MemoryStream:
+    # in-memory input of a session, bytes are fed by the scenario and read without blocking
+    def __init__(self):
+        self.data = bytearray()
+        self.pos = 0
+
+    def feed(self, data):
+        if self.pos == len(self.data):
+            self.data[:] = b''
+            self.pos = 0
+        self.data += data
+
+    def readinto(self, buf):
+        n = min(len(buf), len(self.data) - self.pos)
+        if n == 0:
+            return None
+        buf[:n] = self.data[self.pos:self.pos + n]
+        self.pos += n
+        return n
+
+    def readline(self):
+        end = self.data.find(b'\n', self.pos)
+        end = len(self.data) if end < 0 else end + 1
+        line = bytes(self.data[self.pos:end])
+        self.pos = end
+        return line
+
+    def close(self):
+        pass
+
+
+class NullStream:
+    # output of a session that takes every byte and only counts them
+    def __init__(self):
+        self.written = 0
+
+    def write(self, data):
+        self.written += len(data)
+        return len(data)
+
+    def close(self):
+        pass
+
+
+def led(state, verbose, print):
+    pass
+
+def status(quiet, name, print):
+    pass
+
+def say(word, n, print):
+    for _ in range(n):
+        print(word)
+
+def args(values, print):
+    pass
+
+def make_cli():
+    # Clivia with the sample commands the scenarios run: led, status, say and args
+    cli = Clivia()
+    p = ArgumentParser(prog='led')
+    p.add_argument('state', type=int)
+    p.add_argument('-v', '--verbose', dest='verbose', action='store_true')
+    cli.add_command('led', led, p)
+    p = ArgumentParser(prog='status')
+    p.add_argument('-q', '--quiet', dest='quiet', action='store_true')
+    p.add_argument('-n', '--name', dest='name', default='')
+    cli.add_command('status', status, p)
+    p = ArgumentParser(prog='say')
+    p.add_argument('word')
+    p.add_argument('-n', dest='n', type=int, default=1)
+    cli.add_command('say', say, p)
+    p = ArgumentParser(prog='args')
+    p.add_argument('values', nargs='*')
+    cli.add_command('args', args, p)
+    return cli
+
+
+def socket_pairs(count, port):
+    # count connected (client, server side) loopback TCP sockets, server side is non-blocking
+    addr = socket.getaddrinfo('127.0.0.1', port)[0][-1]
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind(addr)
+    listener.listen(min(count, 128))
+    pairs = []
+    for _ in range(count):
+        client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        client.connect(addr)
+        conn, _ = listener.accept()
+        conn.setblocking(False)
+        client.setblocking(False)
+        pairs.append((client, stream(conn)))
+    listener.close()
+    return pairs
+
+
+def drain(client):
+    # reads whatever the client socket has received, returns number of bytes
+    n = 0
+    while True:
+        try:
+            data = client.recv(4096)
+        except OSError: # EAGAIN
+            return n
+        if not data:
+            return n
+        n += len(data)
+
+
+def elapsed_us(start):
+    return ticks_diff(ticks_us(), start)
+
+
+class Report:
+    # results of all scenarios, printed as one JSON document
+    def __init__(self):
+        self.results = []
+
+    def add(self, scenario, **values):
+        values['scenario'] = scenario
+        self.results.append(values)
+        print(scenario, values, file=sys.stderr)
+
+    def dump(self):
+        print(json.dumps({
+            'implementation': sys.implementation.name,
+            'version': '.'.join(str(v) for v in sys.implementation.version[:3]),
+            'platform': sys.platform,
+            'results': self.results,
+        }))
@@ -4,7 +4,7 @@ Minimal and functional version of CPython's argparse module.
 
 import sys
 import builtins
-from ucollections import namedtuple
+from compat import namedtuple
 
 
 class _ArgError(BaseException):
@@ -29,9 +29,7 @@ class _Arg:
                 if args:
                     arg = args.pop(0)
                     try:
-                        if self.type == bool:
-                            return (arg.lower() in ['true', '1', 'y', 'yes'])
-                        return self.type(arg) # CHANGE
+                        return self.convert(arg) # CHANGE
                     except ValueError:
                         raise _ArgError("'%s' is not valid value for type: %s" % (arg, self.type.__name__))
                 else:
@@ -70,6 +68,16 @@ class _Arg:
         else:
             assert False
 
+    def convert(self, value):
+        # value of type, raises ValueError when value is not valid for it
+        if self.type == bool and isinstance(value, str):
+            return (value.lower() in ['true', '1', 'y', 'yes'])
+        return self.type(value)
+
+    def default_value(self):
+        # value parse gives when no args are left
+        return [] if self.action == "store" and self.nargs in ("*", "+") else self.default
+
 
 def _dest_from_optnames(opt_names):
     dest = opt_names[0]
@@ -86,6 +94,7 @@ class ArgumentParser:
         self.description = description
         self.opt = []
         self.pos = []
+        self._compiled = False
 
     def add_argument(self, *args, **kwargs):
         action = kwargs.get("action", "store")
@@ -115,6 +124,50 @@ class ArgumentParser:
         list.append(
             _Arg(args, dest, action, kwargs.get("nargs", None),
                  const, default, kwargs.get("help", ""), kwargs.get("type", str)))  # CHANGE
+        self._compiled = False
+
+    def _compile(self):
+        # lookup tables built once, after the last add_argument
+        self._opt_index = {}  # option string: slot index
+        for i, opt in enumerate(self.opt):
+            for name in opt.names:
+                self._opt_index[name] = i
+        self._args = tuple(self.opt + self.pos)
+        self._dests = tuple([arg.dest for arg in self._args])
+        self._defaults = [opt.default for opt in self.opt]
+        self._values = [None] * len(self._dests)
+        self._result = namedtuple("args", self._dests)
+        self._compiled = True
+
+    def dests(self):
+        # destinations in the order of values returned by parse_known_values
+        if not self._compiled:
+            self._compile()
+        return self._dests
+
+    def default_values(self):
+        # new list of default values ordered like dests()
+        if not self._compiled:
+            self._compile()
+        return self._defaults + [pos.default_value() for pos in self.pos]
+
+    def convert(self, i, value):
+        # value of dests()[i] given as is, e.g. by a frame, converted like parsed words
+        # raises ValueError or TypeError when it does not fit the argument
+        if not self._compiled:
+            self._compile()
+        arg = self._args[i]
+        if arg.action != "store" or value is None:
+            return value
+        if arg.nargs is None or arg.nargs == "?":
+            return arg.convert(value)
+        if not isinstance(value, list):
+            raise TypeError("expecting list for %s" % arg.dest)
+        return [arg.convert(item) for item in value]
+
+    def required_dests(self):
+        # destinations of positional arguments that must be given
+        return [pos.dest for pos in self.pos if pos.nargs not in ("?", "*")]
 
     def usage(self, full, print=builtins.print):
         # print short usage
@@ -158,25 +211,31 @@ class ArgumentParser:
     def parse_known_args(self, args=None, print=builtins.print):
         return self._parse_args_impl(args, True, print=print)
 
-    def _parse_args_impl(self, args, return_unknown, print=builtins.print):
+    def parse_known_values(self, args=None, print=builtins.print):
+        # like parse_known_args, but values come as a list ordered like dests()
+        # the list is reused by the next parse, so copy it if it has to be kept
+        return self._parse_args_impl(args, True, print=print, as_tuple=False)
+
+    def _parse_args_impl(self, args, return_unknown, print=builtins.print, as_tuple=True):
         if args is None:
             args = sys.argv[1:]
         else:
             args = args[:]
         try:
-            return self._parse_args(args, return_unknown)
+            return self._parse_args(args, return_unknown, print, as_tuple)
         except _ArgError as e:
             self.usage(False, print=print)
             print("error:", e)
             sys.exit(2)
 
-    def _parse_args(self, args, return_unknown):
+    def _parse_args(self, args, return_unknown, print=builtins.print, as_tuple=True):
+        if not self._compiled:
+            self._compile()
+
         # add optional args with defaults
-        arg_dest = []
-        arg_vals = []
-        for opt in self.opt:
-            arg_dest.append(opt.dest)
-            arg_vals.append(opt.default)
+        opt_index = self._opt_index
+        arg_vals = self._values
+        arg_vals[:len(self.opt)] = self._defaults
 
         # deal with unknown arguments, if needed
         unknown = []
@@ -191,15 +250,12 @@ class ArgumentParser:
                 # optional arg
                 a = args.pop(0)
                 if a in ("-h", "--help"):
-                    self.usage(True)
+                    self.usage(True, print=print)
                     sys.exit(0)
-                found = False
-                for i, opt in enumerate(self.opt):
-                    if a in opt.names:
-                        arg_vals[i] = opt.parse(a, args)
-                        found = True
-                        break
-                if not found:
+                i = opt_index.get(a)
+                if i is not None:
+                    arg_vals[i] = self.opt[i].parse(a, args)
+                else:
                     if return_unknown:
                         unknown.append(a)
                         consume_unknown()
@@ -213,15 +269,16 @@ class ArgumentParser:
                         break
                     else:
                         raise _ArgError("extra args: %s" % " ".join(args))
+                i = len(self.opt)
                 for pos in self.pos:
-                    arg_dest.append(pos.dest)
-                    arg_vals.append(pos.parse(pos.names[0], args))
+                    arg_vals[i] = pos.parse(pos.names[0], args)
+                    i += 1
                 parsed_pos = True
                 if return_unknown:
                     consume_unknown()
 
         # build and return named tuple with arg values
-        values = namedtuple("args", arg_dest)(*arg_vals)
+        values = self._result(*arg_vals) if as_tuple else arg_vals
         return (values, unknown) if return_unknown else values
 
 
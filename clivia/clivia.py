@@ -1,138 +1,1812 @@
 import argparse
-import shlex
-import sys, io
-import uselect as select
+import lexer
+import cron
+import frame
+import sys, os, io
+import errno
 import socket
 import builtins
 import random
-from micropython import const
+import gc
+from compat import select, asyncio, heapq, OrderedDict, const, stream, async_reader, write_buffer_size, MICROPYTHON
+from compat import ticks_ms, ticks_us, ticks_diff, print_exception, mem_free, isfuture
+
+def _generator():
+    yield
+
+async def _coroutine():
+    pass
+
+_GENERATOR_TYPE = type(_generator())
+_coroutine = _coroutine()
+_COROUTINE_TYPE = type(_coroutine)
+_coroutine.close()
+
+
+class CliviaOutput:
+    # fixed size output buffer of a session, collects handler output and writes it to the stream
+    # in few large writes: when command finishes, when buffer is full or after latency_ms
+    # it is also the bounded outbound queue of the session, see Clivia.apply_backpressure
+    POLICY_DROP_OLDEST = const('drop-oldest') # make room by dropping oldest queued bytes
+    POLICY_PAUSE       = const('pause')       # stop reading session input until queue drains to low watermark
+    POLICY_DISCONNECT  = const('disconnect')  # remove session when queue reaches high watermark
+
+    def __init__(self, stream, size, latency_ms, session=None):
+        self.stream = stream
+        self.session = session
+        self.buf = bytearray(size)
+        self.view = memoryview(self.buf)
+        self.len = 0
+        self.latency_ms = latency_ms
+        self.since = 0              # ticks_ms of the oldest pending byte
+        self.pending = None         # set of outputs with pending bytes, shared with Clivia
+        self.dropped = 0            # bytes the stream did not take in time
+        self.policy = CliviaOutput.POLICY_DROP_OLDEST
+        self.high = size * 3 // 4   # watermarks in bytes queued
+        self.low = size // 4
+        self.congested = False      # queue went over high and did not drain to low yet
+        self.congestions = 0
+        self.framed = False         # stream takes frames, see CliviaFrameSession
+        self.broken = False         # frame was cut short, session is removed, see Clivia.apply_backpressure
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        data = memoryview(data)
+        n = len(data)
+        if self.framed and n > len(self.buf) - self.len:
+            self.flush()
+            if len(self.buf) - self.len < n <= len(self.buf):
+                # frames are queued whole or not at all, oldest ones may be partly sent already
+                self.dropped += n
+                return n
+        i = 0
+        while i < n:
+            free = len(self.buf) - self.len
+            if free == 0:
+                self.flush()
+                free = len(self.buf) - self.len
+                if free == 0:
+                    if self.framed: # frame larger than the buffer stalled, stream is out of sync
+                        self.dropped += n - i
+                        self.broken = True
+                        break
+                    if self.policy != CliviaOutput.POLICY_DROP_OLDEST:
+                        self.dropped += n - i
+                        break
+                    free = min(n - i, self.len)
+                    j = free - 1
+                    while j < self.len and self.buf[j] != 10: # drop up to end of line when possible
+                        j += 1
+                    if j < self.len:
+                        free = j + 1
+                    self.discard(free)
+            k = min(free, n - i)
+            if self.len == 0:
+                self.since = ticks_ms()
+                if self.pending is not None:
+                    self.pending.add(self)
+            self.view[self.len:self.len + k] = data[i:i + k]
+            self.len += k
+            i += k
+        return n
+
+    def flush(self):
+        # writes as much of pending output as stream takes without blocking, keeps the rest
+        if self.len == 0:
+            return
+        try:
+            n = self.stream.write(self.view[:self.len])
+        except OSError: # EAGAIN
+            n = 0
+        if n is None:   # non-blocking socket took nothing
+            n = 0
+        if n < self.len:
+            self.view[:self.len - n] = self.view[n:self.len]
+        self.len -= n
+        if self.len == 0 and self.pending is not None:
+            self.pending.discard(self)
+
+    def discard(self, count):
+        # drops count oldest queued bytes
+        self.view[:self.len - count] = self.view[count:self.len]
+        self.len -= count
+        self.dropped += count
+
+    def due(self, now):
+        return ticks_diff(now, self.since) >= self.latency_ms
+
+    def end(self):
+        # command writing to this output completed, see CliviaTaggedOutput
+        pass
+
+    def write_error(self, message):
+        self.write(frame.message([frame.KIND_ERROR, message]) if self.framed else message + '\n')
+
+    def write_result(self, retval):
+        # default return handler, result frame for framed stream, text line otherwise
+        if self.framed:
+            self.write(frame.message([frame.KIND_RESULT, retval]))
+        elif retval is not None:
+            self.write(Clivia.format_result(retval))
+
+
+class CliviaFanout:
+    # output of command redirected to many targets, data is encoded once and queued to each of them
+    def __init__(self, outputs, files=()):
+        self.outputs = [out for out in outputs if not out.framed]
+        self.framed = [out for out in outputs if out.framed] # get the same text as one output frame
+        self.files = files          # opened for '>>' redirect, closed with fan-out
+        self.session = None
+        self.print = Clivia.printto(self)
+
+    def write(self, data):
+        if self.framed:
+            message = frame.message([frame.KIND_OUTPUT, data if isinstance(data, str) else str(data, 'utf-8')])
+            for out in self.framed:
+                out.write(message)
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        for out in self.outputs:
+            out.write(data)
+        return len(data)
+
+    def write_result(self, retval):
+        # value is serialized once for all text outputs and once for all framed ones
+        if self.framed:
+            message = frame.message([frame.KIND_RESULT, retval])
+            for out in self.framed:
+                out.write(message)
+        if self.outputs and retval is not None:
+            data = Clivia.format_result(retval).encode('utf-8')
+            for out in self.outputs:
+                out.write(data)
+
+    def flush(self):
+        for out in self.outputs:
+            out.flush()
+        for out in self.framed:
+            out.flush()
+
+    def close(self):
+        for f in self.files:
+            f.close()
+
+
+class CliviaTaggedOutput:
+    # output of request with id ('@id cmd args'), in front of session output, so responses to many requests
+    # in flight can be told apart: every line is '@id text' and '@id$' ends the response
+    # framed sessions get [kind, value, id] frames instead, result or error frame ends the response
+    def __init__(self, out, tag):
+        self.out = out
+        self.session = out.session
+        self.framed = out.framed
+        self.tag = tag
+        self.prefix = f"{Clivia.REQUEST_ID}{tag} ".encode('utf-8')
+        self.line_start = True
+        self.print = Clivia.printframes(self, tag) if self.framed else Clivia.printto(self)
+
+    def write(self, data):
+        if self.framed:
+            return self.out.write(data)
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        n = len(data)
+        start = 0
+        while start < n:
+            i = data.find(b'\n', start)
+            stop = n if i < 0 else i + 1
+            if self.line_start:
+                self.out.write(self.prefix)
+            self.out.write(data[start:stop])
+            self.line_start = i >= 0
+            start = stop
+        return n
+
+    def write_result(self, retval):
+        if self.framed:
+            self.out.write(frame.message([frame.KIND_RESULT, retval, self.tag]))
+        elif retval is not None:
+            self.write(Clivia.format_result(retval))
+
+    def write_error(self, message):
+        if self.framed:
+            self.out.write(frame.message([frame.KIND_ERROR, message, self.tag]))
+        else:
+            self.write(message + '\n')
+
+    def flush(self):
+        self.out.flush()
+
+    def end(self):
+        if self.framed or self.session is not None and self.session.closed:
+            return
+        if not self.line_start:
+            self.out.write(b'\n')
+            self.line_start = True
+        self.out.write(self.prefix[:-1] + b'$\n')
+
+
+class CliviaHistogram:
+    # fixed size histogram of microseconds, bucket i counts values below 2**i
+    BUCKETS = 20
+
+    def __init__(self):
+        self.buckets = [0] * CliviaHistogram.BUCKETS
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def add(self, us):
+        self.count += 1
+        self.total += us
+        if us > self.max:
+            self.max = us
+        b = 0
+        last = CliviaHistogram.BUCKETS - 1
+        while us and b < last:
+            us >>= 1
+            b += 1
+        self.buckets[b] += 1
+
+    def percentile(self, q):
+        # upper bound of bucket holding q-th part of values
+        rank = self.count * q
+        seen = 0
+        for b in range(CliviaHistogram.BUCKETS):
+            seen += self.buckets[b]
+            if seen >= rank and seen > 0:
+                return min(1 << b, self.max)
+        return 0
+
+    def snapshot(self):
+        return {'count': self.count, 'total_us': self.total, 'max_us': self.max,
+                'p50_us': self.percentile(0.5), 'p99_us': self.percentile(0.99), 'buckets': list(self.buckets)}
+
+
+class CliviaMetrics:
+    # timing histograms of loop stages, commands and sessions, exists only while stats are enabled
+    STAGES = ('poll', 'receive', 'tokenize', 'parse', 'handler', 'flush')
+
+    def __init__(self):
+        self.since = ticks_ms()
+        self.stages = {}            # stage name: histogram, see STAGES
+        self.commands = {}          # command name: histogram of its handler
+        self.sessions = {}          # session name: histogram of its requests
+
+    @staticmethod
+    def add(table, key, start):
+        # records microseconds from ticks_us start until now
+        histogram = table.get(key)
+        if histogram is None:
+            histogram = table[key] = CliviaHistogram()
+        histogram.add(ticks_diff(ticks_us(), start))
+
+    def stage(self, name, start):
+        CliviaMetrics.add(self.stages, name, start)
+
+    def command(self, name, start):
+        CliviaMetrics.add(self.commands, name, start)
+        CliviaMetrics.add(self.stages, 'handler', start)
+
+    def session(self, name, start):
+        CliviaMetrics.add(self.sessions, name, start)
+
+    def snapshot(self):
+        return {
+            'elapsed_ms': ticks_diff(ticks_ms(), self.since),
+            'stages': {name: h.snapshot() for name, h in self.stages.items()},
+            'commands': {name: h.snapshot() for name, h in self.commands.items()},
+            'sessions': {name: h.snapshot() for name, h in self.sessions.items()},
+        }
+
 
 class CliviaSession:
+    RX_BUFFER_SIZE = 256
+    TX_BUFFER_SIZE = 512
+    TX_LATENCY_MS = 20
+    MAX_TASKS = 4               # generator and coroutine handlers running at once
+
     def __init__(self, name, stdin, stdout):
         self.name = name
         self.stdin = stdin
         self.stdout = stdout
+        self.out = CliviaOutput(stdout, self.TX_BUFFER_SIZE, self.TX_LATENCY_MS, self)
+        self.paused = False
         self.close_in = False
         self.close_out = False
+        self.closed = False
         self.echo_enabled = False
         self.echo_format = '{}'
-        #self.return_handler = CliviaSession.empty_return_handler
+        self.rx_buf = bytearray(self.RX_BUFFER_SIZE)  # received bytes, unconsumed ones in rx_buf[rx_head:rx_len]
+        self.rx_view = memoryview(self.rx_buf)
+        self.rx_head = 0
+        self.rx_len = 0
+        self.rx_discard = False     # rest of a line too long for rx_buf is dropped up to its '\n'
+        self.idle_timeout_ms = 0    # close session after this long without input, 0 never
+        self.keepalive_ms = 0       # send keepalive after this long without input, 0 never
+        self.keepalive = b'\n'
+        self.last_input = 0         # Clivia.clock_ms of last received input
+        self.last_keepalive = 0
+        self.timer = None           # entry in Clivia.timers checking the timeouts above
+        self.return_handler = None  # return_handler(retval, scope, print), Clivia.return_handler when None
+        self.running = []           # CliviaTask objects of this session
+        self.interrupted = False    # Ctrl-C received, its tasks are cancelled by Clivia.loop
 
     def open(self):
         return True
 
     def close(self):
+        self.closed = True
+        self.out.flush()
+        if self.out.pending is not None:
+            self.out.pending.discard(self.out)
         if self.close_in:  self.stdin.close()
         if self.close_out: self.stdout.close()
     
     def readline(self):
         return self.stdin.readline()
 
+    def stream_reader(self):
+        # asyncio stream used by Clivia.serve to await input lines
+        return async_reader(self.stdin, self.fill)
+
+    async def read_request(self, reader):
+        # next input line from stream_reader, None on EOF
+        line = await reader.readline()
+        return line if line else None
+
+    async def drain(self):
+        pass
+
+    def fill(self, buf):
+        # reads bytes that are already available into buf without blocking
+        # returns number of bytes read, None if nothing is available, 0 on EOF
+        try:
+            return self.stdin.readinto(buf)
+        except OSError:
+            return None
+
+    def receive(self):
+        # returns list of complete lines received so far (without line endings), None on EOF
+        # lines are memoryview slices of rx_buf, valid until the next receive
+        buf = self.rx_buf
+        view = self.rx_view
+        head = self.rx_head
+        start = self.rx_len
+        if start == len(buf) and head > 0:
+            # end of buffer reached, partial line wraps around to the front
+            view[:start - head] = view[head:start]
+            start -= head
+            head = 0
+        n = self.fill(view[start:])
+        if n is None:
+            return ()
+        if n == 0:
+            if head < start and not self.rx_discard:
+                # last line without line ending, EOF is reported by the next call
+                self.rx_head = self.rx_len = 0
+                return [view[head:start]]
+            return None
+
+        end = start + n
+        lines = []
+        i = lexer.line_end(buf, start, end) # only new bytes are scanned
+        while i < end:
+            if buf[i] != 10: # Ctrl-C, partial line is dropped
+                self.interrupted = True
+            elif not self.rx_discard:
+                lines.append(view[head:i])
+            self.rx_discard = False
+            head = i + 1
+            i = lexer.line_end(buf, head, end)
+
+        if self.rx_discard or (head == 0 and end == len(buf)):
+            # line does not fit in the buffer, it is not run in pieces
+            if not self.rx_discard:
+                self.rx_discard = True
+                self.out.write_error("line too long")
+            head = end
+        if head == end:
+            head = end = 0
+        self.rx_head = head
+        self.rx_len = end
+        return lines
+
+    def set_backpressure(self, policy, high=None, low=None):
+        # policy is one of CliviaOutput.POLICY_*, watermarks are in bytes of queued output
+        self.out.policy = policy
+        if high is not None:
+            self.out.high = high
+        if low is not None:
+            self.out.low = low
+
+    def set_timeouts(self, idle_ms=0, keepalive_ms=0, keepalive=None):
+        # takes effect when the session is registered, see Clivia.session_timer
+        self.idle_timeout_ms = idle_ms
+        self.keepalive_ms = keepalive_ms
+        if keepalive is not None:
+            self.keepalive = keepalive
+
     def set_echo(self, enabled, echo_format=None):
         self.echo_enabled = enabled
         if echo_format is not None:
             self.echo_format = echo_format
 
     def echo(self, input_line):
+        if not self.echo_enabled:
+            return
+        if not isinstance(input_line, str):
+            input_line = str(input_line, 'utf-8')
         input_line = input_line.strip()
-        if self.echo_enabled and len(input_line) > 0:
-            self.print(self.echo_format.format(input_line))
+        if len(input_line) > 0:
+            self.out.write(self.echo_format.format(input_line) + '\n')
+
+
+class CliviaWait:
+    # yielded or awaited by generator and coroutine handlers to be resumed after ms, see Clivia.sleep_ms
+    # Clivia.task_timer drives every handler, under loop() and serve() alike, so awaiting it only yields it
+    def __init__(self, ms):
+        self.ms = ms
+
+    def __iter__(self):
+        yield self
+
+    def __await__(self):
+        yield self
+
+
+class CliviaTask:
+    # generator or coroutine handler resumed by Clivia on later ticks, see Clivia.start_task
+    def __init__(self, id, coroutine, node, session, out, stream_out, print):
+        self.id = id
+        self.coroutine = coroutine
+        self.node = node
+        self.session = session
+        self.out = out              # output of requesting session, ended with the task
+        self.stream_out = stream_out # output of the command, may be redirected
+        self.print = print
+        self.started = 0            # Clivia.clock_ms
+        self.deadline = None        # Clivia.clock_ms of timeout
+        self.timer = None           # entry in Clivia.timers resuming the task
+        self.atask = None           # asyncio task awaiting a future the coroutine yielded under Clivia.serve
+
+
+class CliviaPipe:
+    # stdin of pipeline stage, lines printed or yielded by the previous stage, which runs as they are read
+    # 'async for' hands waits of the previous stage to the task driving the pipeline and gives way every
+    # Clivia.TASK_STEPS lines, plain 'for' runs the previous stage at once and skips its waits
+    GIVE_WAY = CliviaWait(0)
+
+    def __init__(self, retval, printed):
+        self.source = retval if Clivia.is_generator(retval) or Clivia.is_coroutine(retval) else None
+        self.lines = printed        # print of the previous stage appends to it
+        self.waiting = None         # wait of the previous stage after lines it printed before
+        self.count = 0
+
+    def pull(self):
+        # runs previous stage until it has a line in lines or waits, returns what it waits for
+        # (None to give way, CliviaWait or asyncio future), raises StopIteration when all lines are read
+        while not self.lines:
+            if self.waiting is not None:
+                wait, self.waiting = self.waiting, None
+                return wait
+            if self.source is None:
+                raise StopIteration
+            try:
+                item = self.source.send(None)
+            except StopIteration:
+                self.source = None
+                continue
+            if item is None or isinstance(item, CliviaWait) or isfuture(item):
+                if not self.lines:
+                    return item
+                self.waiting = item
+            else:
+                self.lines.append(item)
+        return None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        while not self.lines:
+            if isfuture(self.pull()):
+                raise RuntimeError("previous stage awaits asyncio, read stdin with async for")
+        return self.lines.pop(0)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while not self.lines:
+            try:
+                wait = self.pull()
+            except StopIteration:
+                raise StopAsyncIteration
+            if self.lines:
+                break
+            if isfuture(wait):
+                wait._asyncio_future_blocking = False # awaited here for the previous stage, see Clivia.await_task
+                try:
+                    await wait
+                except Exception: # raised in the previous stage when it is resumed
+                    pass
+            else:
+                await (CliviaPipe.GIVE_WAY if wait is None else wait)
+        self.count += 1
+        if self.count % Clivia.TASK_STEPS == 0:
+            await CliviaPipe.GIVE_WAY
+        return self.lines.pop(0)
+
+
+class CliviaJob:
+    # command run by Clivia scheduler at fixed interval or on cron schedule, parsed once when added
+    def __init__(self, id, text, stages, targets, session, interval_ms=0, schedule=None):
+        self.id = id
+        self.text = text            # command line as given, for listing
+        self.stages = stages        # prepared pipeline, see Clivia.prepare_pipeline
+        self.targets = targets
+        self.session = session      # gets output unless redirected, job ends with it
+        self.interval_ms = interval_ms
+        self.schedule = schedule    # cron.CronSchedule or None
+        self.deadline = 0           # Clivia.clock_ms of the next run
+        self.timer = None
+        self.runs = 0
+        self.overruns = 0           # periods skipped because previous run ended too late
+        self.jitter_sum = 0         # ms runs started after their deadline
+        self.jitter_max = 0
+
+    def describe(self):
+        return self.schedule.spec if self.schedule is not None else f"{self.interval_ms:d}ms"
+
+
+class CliviaScope:
+    # what return handler gets with the value, kwargs dict is reused by next call of the command
+    def __init__(self, cmd, func, kwargs, session, out):
+        self.cmd = cmd
+        self.func = func
+        self.args = ()
+        self.kwargs = kwargs
+        self.session = session
+        self.out = out              # output the command printed to, write_result serializes value into it
+
+
+class CliviaCommandNode:
+    # node of the command trie, a group of sub-commands and/or a command itself
+    def __init__(self, word, name, description=''):
+        self.word = word            # last word of the command, e.g. 'ls'
+        self.name = name            # full command, e.g. '~session ls'
+        self.description = description
+        self.children : dict[str, CliviaCommandNode] = {} # word: node, aliases point to the same node
+        self.aliases = set()        # words of children that are aliases, see Clivia.add_alias
+        self.func = None
+        self.parser = None
+        self.binding = None         # (parser dests, reused kwargs dict)
+        self.pass_session = False
+        self.pass_stdin = False     # handler reads lines of previous pipeline stage from stdin argument
+        self.raw_args = False       # handler gets words after the command unparsed as args, operators included
+        self.timeout_ms = 0         # generator and coroutine handlers are cancelled after it, 0 never
+        self.lazy = None            # (module, builder) for commands built on first use
+        self.id = None              # index in Clivia.command_ids, framed sessions call commands by it
+        self.last_used = 0
+
+    def bind(self):
+        self.binding = (('args',) if self.raw_args else self.parser.dests(), {})
+
+    def child(self, word):
+        node = self.children.get(word)
+        if node is None:
+            # not registered, try unambiguous prefix of sub-command or alias
+            for name, candidate in self.children.items():
+                if name.startswith(word):
+                    if node is not None and node is not candidate:
+                        return None
+                    node = candidate
+        return node
+
+    def help(self, print=builtins.print):
+        if self.parser is not None:
+            self.parser.usage(False, print=print)
+        description = self.description or (self.parser.description if self.parser is not None else '')
+        if description:
+            print(description)
+        if not self.children:
+            return
+        print("\ncommands:" if self.name else "commands:")
+        for word in sorted(self.children):
+            node = self.children[word]
+            if word in self.aliases: continue
+            description = node.description or (node.parser.description if node.parser is not None else '')
+            print("  %-16s%s" % (word, description))
 
 
 class Clivia:
     SESSION_ID_COUNTER = 0
     OPERATOR_REDIRECT_OUT = const('>')
+    OPERATOR_REDIRECT_APPEND = const('>>')
+    OPERATOR_PIPE = const('|')
+    TASK_STEPS = 16                                        # output lines a task may yield in one tick
+    REQUEST_ID = const('@')
+    REQUEST_ID_BYTE = const(64) # '@'
+    PARSE_CACHE_SIZE = 32
 
     def __init__(self):
         self.sessions    : dict[str, CliviaSession] = {}   # name: session object (name, permlvl, cache)
-        self.parsers     : dict[str, argparse.ArgumentParser] = {}   # command: ArgumentParser
-        self.commands    : dict[str, (function, int)] = {} # command: (func, permlvl)
+        self.commands    = CliviaCommandNode('', '')       # root of command trie
+        self.command_ids = []                              # command nodes in order they were added
+        self.lazy_loaded = []                              # lazy command nodes currently built
+        self.lazy_unload_below = None                      # free heap (bytes) under which lazy commands are unloaded
+        self.command_clock = 0
+        self.printers    : dict[object, function] = {}     # session output: print wrapper
+        self.pending_outputs = set()                       # session outputs with bytes not written yet
+        self.streams     : dict[object, CliviaSession] = {}  # session.stdin: session object
+        self.poller = select.poll()
+        self.servers = []
+        self.unbound_servers = []                          # registered servers not listening yet
+        self.listeners   : dict[object, CliviaTCPServer] = {} # listening socket: server
+        self.tasks       : dict[str, asyncio.Task] = {}    # session name: reader task (Clivia.serve only)
+        self.timers = []                                   # heap of [deadline, seq, func, arg], see schedule
+        self.timer_seq = 0
+        self.timer_task = None
+        self.timers_changed = None                         # wakes up serve_timers (Clivia.serve only)
+        self.clock_ms = 0                                  # monotonic milliseconds, does not wrap like ticks_ms
+        self.clock_ticks = ticks_ms()
+        self.stats = {'sessions_reaped': 0, 'keepalives': 0, 'parse_hits': 0, 'parse_misses': 0}
+        self.return_handler = None                         # for sessions without their own, see handle_return
+        self.metrics     : CliviaMetrics = None            # timing histograms, None while stats are disabled
+        self.parse_cache = OrderedDict()                   # lexer.line_hash: (line, (stages, targets)), least recently used first
+        self.jobs        : dict[int, CliviaJob] = {}       # id: scheduled job
+        self.job_counter = 0
+        self.console_session = None                        # session of jobs added without one
+        self.running     : dict[int, CliviaTask] = {}      # id: generator or coroutine handler in progress
+        self.task_counter = 0
+        self.serving = False
+        self.stopped = None
+        self.add_system_commands()
     
     def __enter__(self):
         for session in self.sessions.values():
             session.open()
         
     def __exit__(self, exc_type, exc_value, exc_traceback):
-        for session in self.sessions.values():
+        for session in list(self.sessions.values()):
             self.remove_session(session.name)
 
     def register_session(self, session: CliviaSession):
         self.sessions[session.name] = session
+        session.out.pending = self.pending_outputs
+        session.last_input = session.last_keepalive = self.tick()
+        if session.idle_timeout_ms or session.keepalive_ms:
+            session.timer = self.schedule(session.keepalive_ms or session.idle_timeout_ms, self.session_timer, session)
+        if self.serving:
+            self.tasks[session.name] = asyncio.create_task(self.serve_session(session))
+        else:
+            self.streams[session.stdin] = session
+            self.poller.register(session.stdin, select.POLLIN)
+
+    def register_server(self, server):
+        # loop() binds server and polls its socket with sessions, serve() starts it with asyncio instead
+        self.servers.append(server)
+        self.unbound_servers.append(server)
+
+    def listen_servers(self):
+        for server in self.unbound_servers:
+            if server.socket is None:
+                server.listen()
+            self.listeners[server.socket] = server
+            self.poller.register(server.socket, select.POLLIN)
+        self.unbound_servers.clear()
     
-    def add_command(self, command, func, parser: argparse.ArgumentParser):
-        self.parsers[command] = parser
-        self.commands[command] = func
+    def add_command(self, command, func, parser: argparse.ArgumentParser = None, aliases=(), pass_session=False, pass_stdin=False, raw_args=False, timeout_ms=0):
+        # command may have several words, e.g. '~session ls', groups on the way are created
+        # func may be a lazy spec (module, builder) instead, builder() returns (func, parser)
+        if parser is None and not (type(func) is tuple and len(func) == 2
+                                   and type(func[0]) is str and type(func[1]) is str):
+            raise TypeError(f"command needs a parser or a lazy spec (module, builder): {command}")
+        node = self.add_group(command)
+        if node.id is None:
+            node.id = len(self.command_ids)
+            self.command_ids.append(node)
+        if parser is None:
+            node.lazy = func
+        else:
+            node.func = func
+            node.parser = parser
+        node.pass_session = pass_session
+        node.pass_stdin = pass_stdin
+        node.raw_args = raw_args
+        node.timeout_ms = timeout_ms
+        if parser is not None:
+            node.bind()
+        for alias in aliases:
+            self.add_alias(alias, command)
+        return node
+
+    def add_group(self, command, description=None):
+        self.parse_cache.clear() # every change of the trie goes through here
+        node = self.commands
+        for word in command.split():
+            child = node.children.get(word)
+            if child is None:
+                child = node.children[word] = CliviaCommandNode(word, f"{node.name} {word}".lstrip())
+            node = child
+        if description is not None:
+            node.description = description
+        return node
+
+    def add_alias(self, alias, command):
+        # alias may point anywhere in the trie, e.g. '~session-ls' -> '~session ls'
+        node = self.add_group(command)
+        words = alias.split()
+        parent = self.add_group(' '.join(words[:-1]))
+        parent.children[words[-1]] = node
+        parent.aliases.add(words[-1])
+
+    def resolve(self, words):
+        # returns deepest command node matching words and index of its first argument
+        node = self.commands
+        i = 0
+        while i < len(words) and node.children:
+            child = node.child(words[i])
+            if child is None:
+                break
+            node = child
+            i += 1
+        return node, i
+
+    def load_command(self, node):
+        # imports and builds lazy command, unloading least recently used ones under memory pressure
+        # returns False when import or builder fails, node.func stays None then
+        if self.lazy_unload_below is not None:
+            gc.collect()
+            while self.lazy_loaded and mem_free() < self.lazy_unload_below:
+                self.unload_command(min(self.lazy_loaded, key=lambda n: n.last_used))
+
+        try:
+            module_name, builder = node.lazy
+            module = __import__(module_name, None, None, (builder,))
+            func, parser = getattr(module, builder)()
+        except Exception as exc:
+            print_exception(exc)
+            return False
+        node.func, node.parser = func, parser
+        node.bind()
+        self.lazy_loaded.append(node)
+        return True
+
+    def unload_command(self, node):
+        node.func = node.parser = node.binding = None
+        self.lazy_loaded.remove(node)
+        module_name = node.lazy[0]
+        for loaded in self.lazy_loaded:
+            if loaded.lazy[0] == module_name:
+                return
+        sys.modules.pop(module_name, None)
+        gc.collect()
+
+    def unload_commands(self, count=None):
+        # unloads count least recently used lazy commands, all by default
+        nodes = sorted(self.lazy_loaded, key=lambda n: n.last_used)
+        for node in nodes[:count]:
+            self.unload_command(node)
+
+    def tick(self):
+        # advances and returns clock_ms
+        now = ticks_ms()
+        self.clock_ms += ticks_diff(now, self.clock_ticks)
+        self.clock_ticks = now
+        return self.clock_ms
+
+    def schedule(self, delay_ms, func, arg=None):
+        # calls func(arg, now) after delay_ms, it returns delay of its next call or None
+        # returned entry is reused by every rescheduling, cancel_timer(entry) stops it
+        self.timer_seq += 1
+        entry = [self.tick() + delay_ms, self.timer_seq, func, arg]
+        heapq.heappush(self.timers, entry)
+        if self.timers_changed is not None and self.timers[0] is entry:
+            self.timers_changed.set()
+        return entry
+
+    @staticmethod
+    def cancel_timer(entry):
+        # entry stays in the heap until its deadline and is dropped then
+        entry[2] = entry[3] = None
+
+    def run_timers(self, now):
+        # only expired entries are touched, cost per tick does not depend on number of timers
+        # entries rescheduled with no delay wait for the next run, they sort after those expired before
+        timers = self.timers
+        last_seq = self.timer_seq
+        while timers and timers[0][0] <= now and timers[0][1] <= last_seq:
+            entry = heapq.heappop(timers)
+            func = entry[2]
+            if func is None:
+                continue
+            delay = func(entry[3], now)
+            if delay is not None and entry[2] is not None:
+                self.timer_seq += 1
+                entry[0] = now + delay
+                entry[1] = self.timer_seq
+                heapq.heappush(timers, entry)
+
+    def session_timer(self, session, now):
+        # closes session idle for too long and sends keepalives, returns delay to the next check
+        timeout = session.idle_timeout_ms
+        interval = session.keepalive_ms
+        idle = now - session.last_input
+        if timeout and idle >= timeout:
+            self.stats['sessions_reaped'] += 1
+            self.remove_session(session.name)
+            return None
+        delay = timeout - idle if timeout else interval
+        if interval:
+            if idle >= interval and now - session.last_keepalive >= interval:
+                session.last_keepalive = now
+                session.out.write(session.keepalive)
+                session.out.flush()
+                self.stats['keepalives'] += 1
+            due = max(session.last_input, session.last_keepalive) + interval - now
+            delay = min(delay, due) if timeout else due
+        return delay
+
+    def add_job(self, line, interval_ms=0, schedule=None, session=None):
+        # runs command line every interval_ms or on cron schedule ('*/5 * * * *'), returns job or None
+        # line is tokenized and parsed here once, every run reuses its argument values
+        if session is None:
+            session = self.console()
+        _print = self.printer(session.out)
+        try:
+            if schedule is not None:
+                schedule = cron.CronSchedule(schedule)
+                delay = schedule.delay_ms()
+            elif interval_ms <= 0:
+                raise ValueError("interval must be positive")
+            else:
+                delay = interval_ms
+        except ValueError as exc:
+            _print(f"invalid schedule: {exc}")
+            return None
+        prepared = self.prepare_line(line, session.out)
+        if prepared is None:
+            return None
+        stages, targets = prepared
+        self.job_counter += 1
+        job = self.jobs[self.job_counter] = CliviaJob(self.job_counter, line, stages, targets, session, interval_ms, schedule)
+        job.timer = self.schedule(delay, self.job_timer, job)
+        job.deadline = job.timer[0]
+        return job
+
+    def remove_job(self, id):
+        job = self.jobs.pop(id)
+        Clivia.cancel_timer(job.timer)
+
+    def job_timer(self, job, now):
+        jitter = now - job.deadline
+        job.jitter_sum += jitter
+        job.jitter_max = max(job.jitter_max, jitter)
+        job.runs += 1
+        for node, _, _ in job.stages:
+            if not self.touch(node):
+                job.session.out.write_error(f"cannot load command: {node.name}")
+                job.session.out.flush()
+                return
+        try:
+            self.run_pipeline(job.stages, job.targets, job.session)
+        except RuntimeError: # printed already, job keeps running
+            pass
+        job.session.out.flush()
+        self.apply_backpressure(job.session)
+        if job.id not in self.jobs: # session was disconnected with its jobs
+            return None
+
+        end = self.tick()
+        if job.schedule is not None:
+            job.deadline = end + job.schedule.delay_ms()
+        else:
+            job.deadline += job.interval_ms
+            if job.deadline <= end: # skip periods missed, runs do not pile up
+                missed = (end - job.deadline) // job.interval_ms + 1
+                job.overruns += missed
+                job.deadline += missed * job.interval_ms
+        return job.deadline - now
+
+    def console(self):
+        # output of jobs added without session goes to sys.stdout
+        if self.console_session is None:
+            session = self.console_session = CliviaSession('~console', None, sys.stdout)
+            session.out.stream = sys.stdout.buffer
+            session.out.pending = self.pending_outputs
+        return self.console_session
+
+    @staticmethod
+    def parse_interval(text):
+        # '500ms', '2s', '5m', '1h' or plain milliseconds
+        for unit, scale in (('ms', 1), ('s', 1000), ('m', 60000), ('h', 3600000)):
+            if text.endswith(unit):
+                return int(float(text[:-len(unit)]) * scale)
+        return int(text)
 
-    @micropython.viper
     def loop(self):
-    
-        readers, _, _ = select.select([session.stdin for session in self.sessions.values()], [], [], 0)
-        
-        for reader in readers:
-            source_session = object()
-            for session in self.sessions.values():
-                if session.stdin == reader:
-                    source_session = session
+
+        if self.timers and self.timers[0][0] <= self.tick():
+            self.run_timers(self.clock_ms)
+
+        if self.unbound_servers:
+            self.listen_servers()
+
+        if self.pending_outputs:
+            self.flush_outputs()
+
+        metrics = self.metrics
+        if metrics is not None:
+            start = ticks_us()
+        events = self.poller.poll(0)
+        if metrics is not None:
+            metrics.stage('poll', start)
+
+        for event in events:
+            source_session = self.streams.get(event[0])
+            if source_session is None:
+                server = self.listeners.get(event[0])
+                if server is not None:
+                    server.accept_clients(self)
+                continue
+            if event[1] & (select.POLLHUP | select.POLLERR):
+                self.remove_session(source_session.name)
+                continue
+            if source_session.paused:
+                continue
+
+            if metrics is not None:
+                start = ticks_us()
+            lines = source_session.receive()
+            if metrics is not None:
+                metrics.stage('receive', start)
+            if lines is None:
+                self.remove_session(source_session.name)
+                continue
+            source_session.last_input = self.clock_ms
+            if source_session.interrupted:
+                source_session.interrupted = False
+                self.cancel_tasks(source_session)
+
+            for line in lines:
+                if metrics is not None:
+                    start = ticks_us()
+                try: # like serve_session, a failing line must not stop the other sessions
+                    if source_session.out.framed:
+                        self.execute_frame(line, source_session)
+                    else:
+                        source_session.echo(line)
+                        self.execute_input(line, source_session)
+                except Exception as exc:
+                    print_exception(exc)
+                if metrics is not None:
+                    metrics.session(source_session.name, start)
+                if source_session.closed:
                     break
+            if metrics is not None:
+                start = ticks_us()
+            source_session.out.flush() # output of all lines received in this tick at once
+            if metrics is not None:
+                metrics.stage('flush', start)
+            self.apply_backpressure(source_session)
 
-            line = source_session.readline()
-            if isinstance(line, bytes):
-                line = line.decode('utf-8')
-            line.strip()
-            #if len(line) == 0: continue
+    def flush_outputs(self):
+        # writes outputs with bytes pending for their latency, output of jobs and tasks among them
+        now = ticks_ms()
+        for out in list(self.pending_outputs):
+            if out.due(now):
+                out.flush()
+            if out.session is not None:
+                self.apply_backpressure(out.session)
+
+    def apply_backpressure(self, session):
+        # reacts on session output queue crossing its watermarks according to its policy
+        if session.closed:
+            return
+        out = session.out
+        if out.broken:
+            self.remove_session(session.name)
+            return
+        if not out.congested:
+            if out.len < out.high:
+                return
+            out.congested = True
+            out.congestions += 1
+            if out.policy == CliviaOutput.POLICY_PAUSE:
+                self.pause_session(session, True)
+            elif out.policy == CliviaOutput.POLICY_DISCONNECT:
+                self.remove_session(session.name)
+        elif out.len <= out.low:
+            out.congested = False
+            if session.paused:
+                self.pause_session(session, False)
 
-            source_session.echo(line)
-            
-            self.execute_input(line, source_session)
+    def pause_session(self, session, paused):
+        session.paused = paused
+        if session.stdin in self.streams:
+            self.poller.modify(session.stdin, 0 if paused else select.POLLIN)
     
+    def loop_forever(self):
+        asyncio.run(self.serve())
+
+    async def serve(self):
+        self.serving = True
+        self.unbound_servers.clear()
+        self.stopped = asyncio.Event()
+        self.timers_changed = asyncio.Event()
+        self.timer_task = asyncio.create_task(self.serve_timers())
+        for server in self.servers:
+            await server.start(self)
+        for session in list(self.sessions.values()):
+            self.tasks[session.name] = asyncio.create_task(self.serve_session(session))
+
+        await self.stopped.wait()
+
+        for server in self.servers:
+            server.stop()
+        self.timer_task.cancel()
+        self.timer_task = self.timers_changed = None
+        self.serving = False
+
+    def stop(self):
+        if self.stopped is not None:
+            self.stopped.set()
+
+    async def serve_timers(self):
+        # sleeps until the earliest deadline or until an earlier timer is scheduled
+        # pending outputs are retried every TX_LATENCY_MS, as loop() does on every tick
+        while True:
+            now = self.tick()
+            self.run_timers(now)
+            if self.pending_outputs:
+                self.flush_outputs()
+            self.timers_changed.clear()
+            if self.timers and self.timers[0][0] <= now: # tasks to resume, sessions go first
+                await asyncio.sleep(0)
+                continue
+            timeout = None
+            if self.timers:
+                timeout = self.timers[0][0] - now
+            if self.pending_outputs:
+                timeout = CliviaSession.TX_LATENCY_MS if timeout is None else min(timeout, CliviaSession.TX_LATENCY_MS)
+            try:
+                if timeout is not None:
+                    await asyncio.wait_for(self.timers_changed.wait(), timeout / 1000)
+                else:
+                    await self.timers_changed.wait()
+            except asyncio.TimeoutError:
+                pass
+
+    async def serve_session(self, session):
+        reader = session.stream_reader()
+        while not session.closed:
+            request = await session.read_request(reader)
+            if request is None:
+                break
+            session.last_input = self.tick()
+            metrics = self.metrics
+            if metrics is not None:
+                start = ticks_us()
+            try:
+                if session.out.framed:
+                    retval = self.execute_frame(request, session)
+                else:
+                    line = request
+                    if b'\x03' in line: # Ctrl-C
+                        self.cancel_tasks(session)
+                        line = line[line.rindex(b'\x03') + 1:]
+                    session.echo(line)
+                    self.execute_input(line, session)
+            except Exception as exc:
+                print_exception(exc)
+            if metrics is not None:
+                metrics.session(session.name, start)
+            if session.closed: # e.g. exit, the session and its writer are gone
+                break
+            session.out.flush()
+            try:
+                await session.drain()
+                self.apply_backpressure(session)
+                while session.paused and not session.closed: # POLICY_PAUSE, no input until output drains
+                    await asyncio.sleep(session.out.latency_ms / 1000)
+                    await session.drain()
+                    session.out.flush()
+                    self.apply_backpressure(session)
+            except OSError: # peer reset the connection
+                break
+
+        self.tasks.pop(session.name, None)
+        if not session.closed:
+            self.remove_session(session.name)
+
     def execute_input(self, line_input, source_session):
+        # line_input is str or bytes-like, e.g. memoryview of receive buffer, which must not be kept
         session = source_session
+        if isinstance(line_input, str):
+            line_input = line_input.encode('utf-8')
+        n = len(line_input)
 
-        words = shlex.split(line_input)
-        if len(words) == 0: return # fix this
+        # '@id cmd args', output lines of request are tagged with its id, see CliviaTaggedOutput
+        out = session.out
+        if n > 0 and line_input[0] == Clivia.REQUEST_ID_BYTE:
+            i = 1
+            while i < n and line_input[i] != 32: # ' '
+                i += 1
+            out = CliviaTaggedOutput(out, str(line_input[1:i], 'utf-8').strip())
+            line_input = line_input[i + 1:]
+            n = len(line_input)
 
-        command = words[0]
-        if command is "exit":
-            self.remove_session(session.name)
+        # repeated lines skip lexer and parser, see PARSE_CACHE_SIZE
+        # keyed by hash of line, so a hit allocates nothing, copy of line in entry tells collisions apart
+        cache = self.parse_cache
+        key = lexer.line_hash(line_input, n)
+        entry = cache.get(key)
+        if entry is not None and len(entry[0]) == n and lexer.same(line_input, entry[0], n):
+            self.stats['parse_hits'] += 1
+            del cache[key]
+            cache[key] = entry
+            prepared = entry[1]
+            for node, _, _ in prepared[0]:
+                if not self.touch(node):
+                    out.write_error(f"cannot load command: {node.name}")
+                    out.end()
+                    return
+        else:
+            self.stats['parse_misses'] += 1
+            prepared = self.prepare_line(line_input, out)
+            if prepared is None:
+                out.end()
+                return
+            if entry is None and len(cache) >= Clivia.PARSE_CACHE_SIZE:
+                del cache[next(iter(cache))]
+            cache[key] = (bytes(line_input), prepared)
+
+        stages, targets = prepared
+        return self.run_pipeline(stages, targets, session, out)
+
+    def prepare_line(self, line, out):
+        # tokenizes and parses command line, returns (stages, redirect targets) or None
+        metrics = self.metrics
+        if metrics is not None:
+            start = ticks_us()
+        try:
+            line_words = lexer.split(line)
+        except ValueError as exc: # unbalanced quotes, also UnicodeError of bytes that are not UTF-8
+            out.write_error(f"invalid line: {exc}")
+            return None
+        if metrics is not None:
+            metrics.stage('tokenize', start)
+            start = ticks_us()
+        if len(line_words) == 0:
+            return None
+        words, targets = Clivia.split_redirect(line_words)
+        if targets is not None or Clivia.OPERATOR_PIPE in words:
+            if self.resolve(words)[0].raw_args: # operators are arguments, e.g. every 1s cmd > tcps/*
+                words, targets = line_words, None
+        stages = self.prepare_pipeline(words, out)
+        if metrics is not None:
+            metrics.stage('parse', start)
+        if stages is None:
+            return None
+        return stages, targets
+
+    def execute_frame(self, payload, session):
+        # request of framed session, [command, args] or [command, args, id], answered by result or error frame
+        tag = None
+        try:
+            request = frame.unpack(payload)
+            command = request[0]
+            args = request[1] if len(request) > 1 else None
+            tag = request[2] if len(request) > 2 else None
+            if isinstance(command, int):
+                node = self.command_ids[command]
+            else:
+                words = command.split()
+                node, i = self.resolve(words)
+                if i < len(words):
+                    raise KeyError
+        except (ValueError, TypeError, IndexError, KeyError):
+            session.send(frame.KIND_ERROR, "invalid request", tag)
+            return
+        if not self.touch(node):
+            session.send(frame.KIND_ERROR, f"cannot load command: {node.name}", tag)
+            return
+        if node.func is None:
+            session.send(frame.KIND_ERROR, f"not a command: {node.name}", tag)
             return
-        elif command is "cat":
-            session.print(' '.join(words))
 
-        func = self.commands[command]
-        
-        argss, unparsed = self.parsers[command].parse_known_args(words[1:])
+        out = session.out if tag is None else CliviaTaggedOutput(session.out, tag)
+        try:
+            values = self.frame_values(node, args, out)
+        except (ValueError, TypeError, AttributeError) as exc:
+            session.send(frame.KIND_ERROR, f"invalid arguments: {exc}", tag)
+            return
+        try:
+            return self.run_pipeline([(node, values, ())], None, session, out)
+        except RuntimeError:
+            session.send(frame.KIND_ERROR, f"command failed: {node.name}", tag)
 
-        stream_out = session.stdout
-        if Clivia.OPERATOR_REDIRECT_OUT in unparsed:
-            if unparsed.index(Clivia.OPERATOR_REDIRECT_OUT) == len(unparsed) - 2:
-                stream_out = self.sessions[unparsed[-1]].stdout
-        
+    def frame_values(self, node, args, out):
+        # argument values from map of destinations, array of words or None for defaults
+        if node.raw_args:
+            return (list(args or ()),)
+        if isinstance(args, list):
+            try:
+                values, unparsed = node.parser.parse_known_values(args, print=self.printer(out))
+            except SystemExit: # usage was sent as output frames
+                raise ValueError(' '.join(args))
+            return values
+        values = node.parser.default_values()
+        args = args or {}
+        dests = node.binding[0]
+        for key, value in args.items():
+            if key not in dests:
+                raise ValueError(f"unknown argument {key}")
+            i = dests.index(key)
+            values[i] = node.parser.convert(i, value)
+        for dest in node.parser.required_dests():
+            if dest not in args:
+                raise ValueError(f"missing argument {dest}")
+        return values
+
+    def prepare_pipeline(self, words, out):
+        # cmd1 | cmd2 | cmd3, every stage reads lines of previous one lazily through its stdin iterator
+        # returns list of (node, values, unparsed) for every stage or None, errors are printed to out
+        stages = []
+        start = 0
+        while start <= len(words):
+            try:
+                end = words.index(Clivia.OPERATOR_PIPE, start)
+            except ValueError:
+                end = len(words)
+            if end < len(words) and self.resolve(words[start:end])[0].raw_args:
+                end = len(words) # operators are arguments, e.g. every 1s cmd | grep x
+            prepared = self.prepare(words[start:end], out)
+            if prepared is None:
+                return
+            node, values, unparsed = prepared
+            if stages and not node.pass_stdin:
+                self.printer(out)(f"command does not read input: {node.name}")
+                return
+            stages.append((node, tuple(values), unparsed)) # parser reuses its values list
+            start = end + 1
+        return stages
+
+    def run_pipeline(self, stages, targets, session, out=None):
+        # out of requesting session (session.out by default) gets output unless redirected and errors,
+        # its end() is called when command completes
+        if out is None:
+            out = session.out
+        stream_out = self.redirect_target(targets, out)
+        if stream_out is None:
+            out.end()
+            return
+
+        started = False
+        metrics = self.metrics
+        if metrics is not None:
+            start = ticks_us()
         try:
-            kwargs = {"print": Clivia.printto(stream_out)}
-            for field in dir(argss):
-                if field is '__class__': continue
-                kwargs[field] = getattr(argss, field)
-            retval = func(**kwargs)
-            #retval = func(**argss, print=lambda *a, **k: builtins.print(*a, file=stream_out, **k))
+            stream = None
+            if len(stages) > 1:
+                for node, values, _ in stages[:-1]:
+                    printed = []
+                    retval = self.call(node, values, session, Clivia.printinto(printed), stream)
+                    stream = CliviaPipe(retval, printed)
+            node, values, _ = stages[-1]
+            _print = self.printer(stream_out)
+            retval = self.call(node, values, session, _print, stream)
+            if metrics is not None:
+                metrics.command(node.name, start)
+            if Clivia.is_generator(retval) or Clivia.is_coroutine(retval):
+                started = True
+                return self.start_task(retval, node, session, out, stream_out, _print)
+            self.handle_return(retval, node, session, stream_out, _print)
         except Exception as exc:
-            sys.print_exception(exc)
+            print_exception(exc)
             raise RuntimeError # todo other error here
+        finally:
+            if not started:
+                Clivia.close_output(stream_out, out)
+        return retval
+
+    def handle_return(self, retval, node, session, out, print):
+        # passes value returned by handler to return handler of session or Clivia,
+        # by default it is serialized into the output of the command
+        if session.closed and out.session is session:
+            return
+        handler = session.return_handler or self.return_handler
+        if handler is None:
+            out.write_result(retval)
+        else:
+            handler(retval, CliviaScope(node.name, node.func, node.binding[1], session, out), print=print)
+
+    @staticmethod
+    def close_output(stream_out, out):
+        # command completed, redirected output is written out and out of requesting session ended
+        if stream_out is not out:
+            stream_out.flush()
+            if isinstance(stream_out, CliviaFanout):
+                stream_out.close()
+        out.end()
+
+    def start_task(self, coroutine, node, session, out, stream_out, print):
+        # generator or coroutine handler runs on later ticks, returns CliviaTask or None when over limit
+        if len(session.running) >= session.MAX_TASKS:
+            coroutine.close()
+            out.write_error(f"too many tasks running: {node.name}")
+            Clivia.close_output(stream_out, out)
+            return None
+        self.task_counter += 1
+        task = CliviaTask(self.task_counter, coroutine, node, session, out, stream_out, print)
+        task.started = self.tick()
+        if node.timeout_ms:
+            task.deadline = task.started + node.timeout_ms
+        self.running[task.id] = task
+        session.running.append(task)
+        task.timer = self.schedule(0, self.task_timer, task)
+        return task
+
+    def task_timer(self, task, now):
+        # resumes task until it waits, yields None or TASK_STEPS output lines, returns delay of next step
+        if task.deadline is not None and now >= task.deadline:
+            task.coroutine.close()
+            self.end_task(task, error='timeout')
+            return None
+        coroutine = task.coroutine
+        delay = 0
+        metrics = self.metrics
+        if metrics is not None:
+            start = ticks_us()
+        for _ in range(Clivia.TASK_STEPS):
+            try:
+                item = coroutine.send(None)
+            except StopIteration as stop:
+                self.end_task(task, stop.args[0] if stop.args else None)
+                return None
+            except Exception as exc:
+                print_exception(exc)
+                self.end_task(task, error='command failed')
+                return None
+            if item is None:
+                break
+            if isinstance(item, CliviaWait):
+                delay = item.ms if task.deadline is None else min(item.ms, task.deadline - now)
+                break
+            if isfuture(item): # coroutine awaited an asyncio object, resumed when it is done
+                if not self.serving:
+                    coroutine.close()
+                    self.end_task(task, error='asyncio needs serve()')
+                    return None
+                task.timer = None
+                task.atask = asyncio.create_task(self.await_task(task, item))
+                delay = None
+                break
+            task.print(item)
+        if metrics is not None:
+            metrics.command(task.node.name, start)
+        task.stream_out.flush() # nothing else flushes it under serve()
+        self.apply_backpressure(task.session)
+        return delay
+
+    async def await_task(self, task, future):
+        # waits for future yielded by coroutine handler under serve(), task_timer resumes the handler
+        # which gets the result or exception of the future from it
+        future._asyncio_future_blocking = False # taken over from the handler, as an asyncio task would
+        try:
+            if task.deadline is not None:
+                await asyncio.wait_for(future, max(0, task.deadline - self.tick()) / 1000)
+            else:
+                await future
+        except asyncio.TimeoutError:
+            task.coroutine.close()
+            self.end_task(task, error='timeout')
+            return
+        except asyncio.CancelledError:
+            if task.id not in self.running: # ended by cancel_task
+                return
+        except Exception:
+            pass
+        task.atask = None
+        task.timer = self.schedule(0, self.task_timer, task)
+
+    def end_task(self, task, retval=None, error=None):
+        if self.running.pop(task.id, None) is None:
+            return
+        task.session.running.remove(task)
+        if task.timer is not None:
+            Clivia.cancel_timer(task.timer)
+        if error is None:
+            self.handle_return(retval, task.node, task.session, task.stream_out, task.print)
+        elif not task.session.closed:
+            task.out.write_error(f"{error}: {task.node.name}")
+        Clivia.close_output(task.stream_out, task.out)
+        if not task.session.closed:
+            task.out.flush()
+
+    def cancel_task(self, task):
+        if task.atask is not None:
+            task.atask.cancel()
+        task.coroutine.close()
+        self.end_task(task, error='cancelled')
+
+    def cancel_tasks(self, session):
+        for task in list(session.running):
+            self.cancel_task(task)
+
+    def enable_stats(self, enabled=True):
+        # timing is recorded only while enabled, enabling again starts from zero
+        self.metrics = CliviaMetrics() if enabled else None
+
+    def stats_snapshot(self):
+        # counters and, while enabled, timing histograms in microseconds
+        snapshot = {'counters': dict(self.stats)}
+        if self.metrics is not None:
+            snapshot.update(self.metrics.snapshot())
+        return snapshot
+
+    @staticmethod
+    def sleep_ms(ms):
+        # yield or await it in generator or coroutine handler to be resumed after ms
+        return CliviaWait(ms)
+
+    def prepare(self, words, out):
+        # resolves command and parses its arguments, returns (node, values, unparsed) or None
+        node, i = self.resolve(words)
+        if not self.touch(node):
+            self.printer(out)(f"cannot load command: {node.name}")
+            return None
+        if node.func is None:
+            if node is self.commands:
+                self.printer(out)(f"unknown command: {words[0] if words else ''}")
+            else:
+                node.help(print=self.printer(out))
+            return None
+
+        if node.raw_args:
+            return node, (words[i:],), []
+        try:
+            values, unparsed = node.parser.parse_known_values(words[i:], print=self.printer(out))
+        except SystemExit: # usage or parse error was printed to the session
+            return None
+        return node, values, unparsed
+
+    def touch(self, node):
+        # builds lazy command if needed and marks it used, False when it cannot be built
+        if node.lazy is not None:
+            if node.func is None and not self.load_command(node):
+                return False
+            self.command_clock += 1
+            node.last_used = self.command_clock
+        return True
+
+    @staticmethod
+    def split_redirect(words):
+        # cmd args > session1 tcps/* ... or cmd args >> file, returns (words, (operator, targets) or None)
+        for i in range(len(words)):
+            if words[i] == Clivia.OPERATOR_REDIRECT_OUT or words[i] == Clivia.OPERATOR_REDIRECT_APPEND:
+                return words[:i], (words[i], words[i + 1:])
+        return words, None
+
+    def redirect_target(self, targets, out):
+        # output for command: out of requesting session, one session output or fan-out to many, None on error
+        if targets is None:
+            return out
+        operator, names = targets
+        if not names:
+            self.printer(out)(f"missing redirect target after {operator}")
+            return None
+
+        if operator == Clivia.OPERATOR_REDIRECT_APPEND:
+            files = []
+            for name in names:
+                try:
+                    files.append(open(name, 'ab'))
+                except OSError:
+                    for f in files:
+                        f.close()
+                    self.printer(out)(f"cannot open file: {name}")
+                    return None
+            return CliviaFanout([CliviaOutput(f, CliviaSession.TX_BUFFER_SIZE, 0) for f in files], files)
+
+        outputs = {}
+        for name in names:
+            if '*' in name:
+                for session_name in self.sessions:
+                    if Clivia.match(name, session_name):
+                        outputs[session_name] = self.sessions[session_name].out
+            elif name in self.sessions:
+                outputs[name] = self.sessions[name].out
+            else:
+                self.printer(out)(f"no such session: {name}")
+                return None
+        if len(outputs) == 1:
+            for out in outputs.values():
+                return out
+        return CliviaFanout(list(outputs.values()))
+
+    @staticmethod
+    def match(pattern, name):
+        # glob match with '*' wildcards only, e.g. 'tcps/*'
+        parts = pattern.split('*')
+        if not name.startswith(parts[0]):
+            return False
+        pos = len(parts[0])
+        for part in parts[1:-1]:
+            pos = name.find(part, pos)
+            if pos < 0:
+                return False
+            pos += len(part)
+        return len(name) - len(parts[-1]) >= pos and name.endswith(parts[-1])
+
+    def call(self, node, values, session, print, stdin=None):
+        # values may be reused by parse cache and jobs, so handlers get their own copy of lists
+        dests, kwargs = node.binding
+        for i in range(len(dests)):
+            value = values[i]
+            kwargs[dests[i]] = list(value) if type(value) is list else value
+        kwargs["print"] = print
+        if node.pass_session:
+            kwargs["session"] = session
+        if node.pass_stdin:
+            kwargs["stdin"] = stdin
+        return node.func(**kwargs)
 
     def parse_words(self, command, words):
-        return self.parsers[command].parse_args(words)
+        return self.resolve(command.split())[0].parser.parse_args(words)
+
+    def add_system_commands(self):
+        p = argparse.ArgumentParser(prog='exit', description='exits current session')
+        self.add_command('exit', self.command_exit, p, pass_session=True)
+
+        p = argparse.ArgumentParser(prog='~help', description='returns system commands')
+        p.add_argument('command', nargs='*', help='command or group to describe')
+        self.add_command('~help', self.command_help, p)
+
+        p = argparse.ArgumentParser(prog='~commands', description='lists commands with ids used by framed sessions')
+        self.add_command('~commands', self.command_commands, p, pass_session=True)
+
+        p = argparse.ArgumentParser(prog='~stats', description='shows counters and timings of loop stages, commands and sessions')
+        p.add_argument('action', nargs='?', help='on, off or reset timings')
+        self.add_command('~stats', self.command_stats, p, pass_session=True)
+
+        self.add_group('~session', 'manages CLI sessions')
+        p = argparse.ArgumentParser(prog='~session ls', description='list existing CLI sessions')
+        p.add_argument('-l', '--long', dest='long', action='store_true', help='show output queue depth and drops')
+        self.add_command('~session ls', self.command_session_ls, p, aliases=('~session-ls',))
+
+        p = argparse.ArgumentParser(prog='~session exit', description='exits existing CLI session')
+        p.add_argument('name', nargs='?', help='session name, current session by default')
+        p.add_argument('--all', dest='all', action='store_true')
+        self.add_command('~session exit', self.command_session_exit, p, aliases=('~session-exit',), pass_session=True)
+
+        self.add_group('~task', 'manages running generator and coroutine commands')
+        p = argparse.ArgumentParser(prog='~task ls', description='lists running tasks')
+        self.add_command('~task ls', self.command_task_ls, p, aliases=('~task-ls',))
+
+        p = argparse.ArgumentParser(prog='~task cancel', description='cancels tasks, those of current session by default')
+        p.add_argument('id', nargs='*', help='task ids')
+        p.add_argument('--all', dest='all', action='store_true')
+        self.add_command('~task cancel', self.command_task_cancel, p, aliases=('~task-cancel',), pass_session=True)
+
+        self.add_group('~job', 'runs commands periodically')
+        p = argparse.ArgumentParser(prog='~job every', description='runs command at fixed interval, e.g. every 500ms sensor-read > tcps/*')
+        p.add_argument('interval', help='number with unit ms, s, m or h')
+        p.add_argument('command', nargs='+', help='command line, redirects included')
+        self.add_command('~job every', self.command_job_every, p, aliases=('every',), pass_session=True, raw_args=True)
+
+        p = argparse.ArgumentParser(prog='~job cron', description='runs command on cron schedule, e.g. cron */5 * * * * sensor-read > tcps/*')
+        p.add_argument('schedule', help='minute hour day month weekday, or one quoted word')
+        p.add_argument('command', nargs='+', help='command line, redirects included')
+        self.add_command('~job cron', self.command_job_cron, p, aliases=('cron',), pass_session=True, raw_args=True)
+
+        p = argparse.ArgumentParser(prog='~job ls', description='lists jobs with their jitter and overruns')
+        self.add_command('~job ls', self.command_job_ls, p, aliases=('~job-ls',))
+
+        p = argparse.ArgumentParser(prog='~job rm', description='removes jobs')
+        p.add_argument('id', nargs='*', help='job ids')
+        p.add_argument('--all', dest='all', action='store_true')
+        self.add_command('~job rm', self.command_job_rm, p, aliases=('~job-rm',))
+
+    def command_exit(self, session, print=builtins.print):
+        self.remove_session(session.name)
+
+    def command_help(self, command, print=builtins.print):
+        node, i = self.resolve(command)
+        if not self.touch(node):
+            print(f"cannot load command: {node.name}")
+        elif i < len(command):
+            print(f"unknown command: {' '.join(command)}")
+        elif node.func is not None and not node.children:
+            node.parser.usage(True, print=print)
+        else:
+            node.help(print=print)
+
+    def command_commands(self, session, print=builtins.print):
+        ids = {}
+        for node in self.command_ids:
+            ids[node.name] = node.id
+        if session.out.framed:
+            return ids
+        for node in self.command_ids:
+            print("%4d %s" % (node.id, node.name))
+
+    def command_stats(self, action, session, print=builtins.print):
+        if action in ('on', 'reset'):
+            self.enable_stats(True)
+            return
+        if action == 'off':
+            self.enable_stats(False)
+            return
+        if action is not None:
+            print(f"unknown action: {action}")
+            return
+        snapshot = self.stats_snapshot()
+        if session.out.framed:
+            return snapshot
+        for name in sorted(snapshot['counters']):
+            print("%-24s %d" % (name, snapshot['counters'][name]))
+        if self.metrics is None:
+            print("timings are off, see ~stats on")
+            return
+        elapsed = max(snapshot['elapsed_ms'], 1)
+        print("%-24s %8s %8s %8s %8s %8s %8s" % ('timing', 'count', 'per s', 'avg us', 'p50 us', 'p99 us', 'max us'))
+        for group in ('stages', 'commands', 'sessions'):
+            for name in sorted(snapshot[group]):
+                h = snapshot[group][name]
+                print("%-24s %8d %8d %8d %8d %8d %8d" % (name if group == 'stages' else group[:-1] + ' ' + name,
+                      h['count'], h['count'] * 1000 // elapsed, h['total_us'] // max(h['count'], 1),
+                      h['p50_us'], h['p99_us'], h['max_us']))
+
+    def command_session_ls(self, long, print=builtins.print):
+        if long:
+            print("%-24s %8s %8s %s" % ('name', 'queued', 'dropped', 'state'))
+        for name in sorted(self.sessions):
+            if not long:
+                print(name)
+                continue
+            session = self.sessions[name]
+            state = 'paused' if session.paused else ('congested' if session.out.congested else '')
+            print("%-24s %8d %8d %s" % (name, session.out.len, session.out.dropped, state))
+
+    def command_session_exit(self, name, all, session, print=builtins.print):
+        if all:
+            names = list(self.sessions)
+        else:
+            names = [session.name if name is None else name]
+        for name in names:
+            if name not in self.sessions:
+                print(f"no such session: {name}")
+                continue
+            self.remove_session(name)
+
+    def command_task_ls(self, print=builtins.print):
+        print("%4s %-16s %8s %s" % ('id', 'session', 'ms', 'command'))
+        now = self.tick()
+        for id in sorted(self.running):
+            task = self.running[id]
+            print("%4d %-16s %8d %s" % (id, task.session.name, now - task.started, task.node.name))
+
+    def command_task_cancel(self, id, all, session, print=builtins.print):
+        if all:
+            tasks = list(self.running.values())
+        elif id:
+            tasks = []
+            for i in id:
+                try:
+                    tasks.append(self.running[int(i)])
+                except (ValueError, KeyError):
+                    print(f"no such task: {i}")
+        else:
+            tasks = list(session.running)
+        for task in tasks:
+            self.cancel_task(task)
+
+    def command_job_every(self, args, session, print=builtins.print):
+        if len(args) < 2:
+            self.resolve(['~job', 'every'])[0].parser.usage(True, print=print)
+            return
+        try:
+            interval = Clivia.parse_interval(args[0])
+        except ValueError:
+            print(f"invalid interval: {args[0]}")
+            return
+        job = self.add_job(lexer.join(args[1:]), interval_ms=interval, session=session)
+        if job is not None:
+            print(f"job {job.id:d}")
+
+    def command_job_cron(self, args, session, print=builtins.print):
+        n = 1 if args and ' ' in args[0] else 5
+        if len(args) <= n:
+            self.resolve(['~job', 'cron'])[0].parser.usage(True, print=print)
+            return
+        job = self.add_job(lexer.join(args[n:]), schedule=' '.join(args[:n]), session=session)
+        if job is not None:
+            print(f"job {job.id:d}")
+
+    def command_job_ls(self, print=builtins.print):
+        print("%4s %-14s %-16s %6s %8s %7s %7s %s" % ('id', 'schedule', 'session', 'runs', 'overruns', 'jit avg', 'jit max', 'command'))
+        for id in sorted(self.jobs):
+            job = self.jobs[id]
+            print("%4d %-14s %-16s %6d %8d %7d %7d %s" % (id, job.describe(), job.session.name, job.runs, job.overruns,
+                  job.jitter_sum // job.runs if job.runs else 0, job.jitter_max, job.text))
+
+    def command_job_rm(self, id, all, print=builtins.print):
+        ids = list(self.jobs) if all else id
+        for id in ids:
+            try:
+                self.remove_job(int(id))
+            except (ValueError, KeyError):
+                print(f"no such job: {id}")
 
     def remove_session(self, session_name):
-        session = self.sessions[session_name]
-        self.sessions.pop(session_name)
+        session = self.sessions.pop(session_name)
+        if self.streams.pop(session.stdin, None) is not None:
+            self.poller.unregister(session.stdin)
+        self.printers.pop(session.out, None)
+        if session.timer is not None:
+            Clivia.cancel_timer(session.timer)
+            session.timer = None
+        for job in list(self.jobs.values()):
+            if job.session is session:
+                self.remove_job(job.id)
+        task = self.tasks.pop(session_name, None)
+        if task is not None and task is not asyncio.current_task():
+            task.cancel()
         session.close()
+        self.cancel_tasks(session) # after close, so tasks end quietly
+        if self.metrics is not None:
+            self.metrics.sessions.pop(session_name, None)
     
+    def printer(self, sout):
+        # print wrappers are created once per output stream
+        if isinstance(sout, (CliviaFanout, CliviaTaggedOutput)):
+            return sout.print
+        _print = self.printers.get(sout)
+        if _print is None:
+            _print = self.printers[sout] = Clivia.printframes(sout) if sout.framed else Clivia.printto(sout)
+        return _print
+
+    @staticmethod
+    def format_result(retval):
+        # cheap text form of return value for text sessions
+        return (retval if isinstance(retval, str) else str(retval)) + '\n'
+
     @staticmethod
     def printto(sout):
-        def _print(*a, **k):
+        # formats the line itself, so any object with write() can be an output (asyncio streams too)
+        def _print(*a, sep=' ', end='\n', **k):
+            nonlocal sout
+            sout.write(sep.join([str(x) for x in a]) + end)
+        return _print
+
+    @staticmethod
+    def printframes(sout, tag=None):
+        # print wrapper of framed session, every call is one output frame, tagged with request id if given
+        def _print(*a, sep=' ', end='\n', **k):
             nonlocal sout
-            k['file'] = sout
-            return builtins.print(*a, **k)
+            text = sep.join([str(x) for x in a]) + end
+            sout.write(frame.message([frame.KIND_OUTPUT, text] if tag is None else [frame.KIND_OUTPUT, text, tag]))
+        return _print
+
+    @staticmethod
+    def printinto(lines):
+        # print wrapper of pipeline stage, every print call is one line for the next stage
+        def _print(*a, sep=' ', end='\n', **k):
+            lines.append(sep.join([str(x) for x in a]))
         return _print
+
+    @staticmethod
+    def is_coroutine(retval):
+        # coroutines and generators share one type on MicroPython
+        return type(retval) is _COROUTINE_TYPE
+
+    @staticmethod
+    def is_generator(retval):
+        return type(retval) is _GENERATOR_TYPE
     
     @staticmethod
     def get_unique_session_name():
@@ -142,12 +1816,70 @@ class Clivia:
 
 
 
+class CliviaFrameSession(CliviaSession):
+    # machine-to-machine session speaking length-prefixed MessagePack frames, see frame module
+    # commands are called by id or name with argument values, no lexer, parser or text formatting
+    def __init__(self, name, stdin, stdout):
+        super().__init__(name, stdin, stdout)
+        self.out.framed = True
+        self.out.policy = CliviaOutput.POLICY_PAUSE # dropping bytes would break framing
+        self.keepalive = frame.message(None) # raw bytes would break framing too
+        self.rx_skip = 0            # bytes of a frame too large for rx_buf still to be skipped
+
+    # Overrides: CliviaSession.set_timeouts
+    def set_timeouts(self, idle_ms=0, keepalive_ms=0, keepalive=None):
+        # keepalive is a value sent as a frame, nil by default
+        super().set_timeouts(idle_ms, keepalive_ms, None if keepalive is None else frame.message(keepalive))
+
+    # Overrides: CliviaSession.receive
+    def receive(self):
+        # returns list of complete frame payloads, None on EOF
+        buf = self.rx_buf
+        n = self.fill(self.rx_view[self.rx_len:])
+        if n is None:
+            return ()
+        if n == 0:
+            return None
+
+        end = self.rx_len + n
+        payloads = []
+        start = min(self.rx_skip, end)
+        self.rx_skip -= start
+        while end - start >= frame.HEADER_SIZE:
+            stop = start + frame.HEADER_SIZE + (buf[start] << 8 | buf[start + 1])
+            if stop - start > len(buf):
+                # request cannot be buffered, it is answered with an error and skipped
+                self.send(frame.KIND_ERROR, "frame too large")
+                self.rx_skip = stop - min(stop, end)
+                start = min(stop, end)
+                continue
+            if stop > end:
+                break
+            payloads.append(bytes(buf[start + frame.HEADER_SIZE:stop]))
+            start = stop
+        if start > 0:
+            buf[:end - start] = buf[start:end]
+        self.rx_len = end - start
+        return payloads
+
+    # Overrides: CliviaSession.read_request
+    async def read_request(self, reader):
+        try:
+            header = await reader.readexactly(frame.HEADER_SIZE)
+            return await reader.readexactly(frame.length(header))
+        except EOFError:
+            return None
+
+    def send(self, kind, value, tag=None):
+        self.out.write(frame.message([kind, value] if tag is None else [kind, value, tag]))
+
+
 class CliviaFile(CliviaSession):
     def __init__(self, input_filename, output_filename, output_mode='w', name=None):
         super().__init__(
             f"file/{Clivia.get_unique_session_name()}" if (name is None) else name,
-            open(input_filename, 'r'),
-            open(output_filename, output_mode))
+            open(input_filename, 'rb'),
+            open(output_filename, output_mode if 'b' in output_mode else output_mode + 'b'))
         
         self.input_filename = input_filename
         self.output_filename = output_filename
@@ -160,12 +1892,31 @@ class CliviaUSB(CliviaSession):
             f"usb/{Clivia.get_unique_session_name()}" if (name is None) else name,
             sys.stdin,
             sys.stdout)
+        self.out.stream = sys.stdout.buffer
+        self.pending = select.poll()
+        self.pending.register(sys.stdin, select.POLLIN)
+
+    # Overrides: CliviaSession.fill
+    def fill(self, buf):
+        # sys.stdin.readinto blocks until buf is full, so take only bytes already pending
+        if not MICROPYTHON:
+            # sys.stdin.buffer reads ahead all pending bytes and hides them from poll, read the fd itself
+            if not self.pending.poll(0):
+                return None
+            data = os.read(self.stdin.fileno(), len(buf))
+            buf[:len(data)] = data
+            return len(data)
+        n = 0
+        while n < len(buf) and self.pending.poll(0):
+            buf[n] = self.stdin.buffer.read(1)[0]
+            n += 1
+        return n if n > 0 else None
 
 class CliviaTCPClient(CliviaSession):
     def __init__(self, server_ip, port, blocking=False, name=None):
         self.server_ip = server_ip
         self.port = port
-        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket = stream(socket.socket(socket.AF_INET, socket.SOCK_STREAM))
         self.socket.setblocking(blocking)
         super().__init__(
             f"tcpc/{server_ip}" if (name is None) else name,
@@ -185,15 +1936,47 @@ class CliviaTCPClient(CliviaSession):
         return False
 
 class CliviaTCPServerSession(CliviaSession):
-    def __init__(self, client_ip, port, socket, name=None):
+    # socket may be None for a pooled session slot of CliviaTCPServer waiting for a client
+    def __init__(self, client_ip, port, socket, name=None, server=None):
         self.client_ip = client_ip
         self.port = port
         self.socket = socket
+        self.server = server
+        if socket is not None:
+            self.socket.setblocking(False)
         super().__init__(
-            f"tcps/{client_ip}" if (name is None) else name,
+            f"tcps/{client_ip}:{port}" if (name is None) else name,
             self.socket,
             self.socket)
         self.close_in = True
+        self.closed = socket is None
+
+    def attach(self, client_ip, port, socket, name=None):
+        # reuses this session object and its buffers for a newly accepted client
+        socket.setblocking(False)
+        self.client_ip = client_ip
+        self.port = port
+        self.socket = self.stdin = self.stdout = self.out.stream = socket
+        self.name = f"tcps/{client_ip}:{port}" if (name is None) else name
+        self.closed = False
+        self.paused = False
+        self.interrupted = False
+        self.rx_head = 0
+        self.rx_len = 0
+        self.rx_discard = False
+        self.out.len = 0
+        self.out.broken = False
+        self.out.dropped = 0
+        self.out.congested = False
+        self.out.congestions = 0
+
+    # Overrides: CliviaSession.close
+    def close(self):
+        if self.closed:
+            return
+        super().close()
+        if self.server is not None:
+            self.server.release(self)
     
     '''
     # Overrides: CliviaSession.open
@@ -208,24 +1991,110 @@ class CliviaTCPServerSession(CliviaSession):
         return False
     '''
 
+class CliviaTCPStreamSession(CliviaSession):
+    # TCP client connected through asyncio.start_server (see CliviaTCPServer.start)
+    def __init__(self, client_ip, port, reader, writer, name=None, server=None):
+        self.client_ip = client_ip
+        self.port = port
+        self.reader = reader
+        self.writer = writer
+        self.server = server
+        super().__init__(
+            f"tcps/{client_ip}:{port}" if (name is None) else name,
+            reader,
+            self)
+
+    # Overrides: CliviaSession.stream_reader
+    def stream_reader(self):
+        return self.reader
+
+    # Overrides: CliviaSession.drain
+    async def drain(self):
+        await self.writer.drain()
+
+    # Overrides: CliviaSession.close
+    def close(self):
+        self.closed = True
+        self.out.flush()
+        if self.out.pending is not None:
+            self.out.pending.discard(self.out)
+        self.writer.close()
+        if self.server is not None and self in self.server.sessions:
+            self.server.sessions.remove(self)
+
+    def write(self, data):
+        # CliviaOutput keeps what the writer buffer has no room for, so its backpressure policy applies
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        room = self.out.high - write_buffer_size(self.writer)
+        if room <= 0:
+            return None
+        data = bytes(data[:room]) # transport may keep it, the queue it comes from moves on
+        self.writer.write(data)
+        return len(data)
+
 class CliviaTCPServer():
-    def __init__(self, ip, port, blocking=False):
+    def __init__(self, ip, port, blocking=False, max_clients=4):
         self.ip = ip
         self.port = port
+        self.blocking = blocking
+        self.max_clients = max_clients
+        self.socket = None # bound on first accept_clients or by Clivia.loop, asyncio binds its own socket
+        self.server = None
+        self.sessions = [] # connected clients
+        self.free = [CliviaTCPServerSession(None, 0, None, f"tcps/slot{i:d}", self) for i in range(max_clients)]
+        self.rejected = 0
+        self.timeouts = (0, 0, None)  # applied to every client session, see CliviaSession.set_timeouts
+
+    def set_timeouts(self, idle_ms=0, keepalive_ms=0, keepalive=None):
+        self.timeouts = (idle_ms, keepalive_ms, keepalive)
+
+    def listen(self):
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.socket.bind((self.ip, self.port))
         self.socket.listen()
-        self.socket.setblocking(blocking)
-        self.sessions = []
-    
+        self.socket.setblocking(self.blocking)
+
+    async def start(self, cli):
+        async def on_client(reader, writer):
+            if len(self.sessions) >= self.max_clients:
+                self.rejected += 1
+                writer.close()
+                return
+            client_ip, port = writer.get_extra_info('peername')[:2]
+            session = CliviaTCPStreamSession(client_ip, port, reader, writer, server=self)
+            session.set_timeouts(*self.timeouts)
+            self.sessions.append(session)
+            cli.register_session(session) # spawns reader task of the session
+        self.server = await asyncio.start_server(on_client, self.ip, self.port)
+
+    def stop(self):
+        if self.server is not None:
+            self.server.close()
+            self.server = None
+
     def accept_clients(self, cli):
+        # Clivia.loop calls it only when a connection is pending on registered server
+        if self.socket is None:
+            self.listen()
         try:
-            tcp = self.socket.accept()
-            if tcp is not None:
-                conn, addr = tcp
-                client_ip, port = addr
-                session = CliviaTCPServerSession(client_ip, port, conn)
-                self.sessions.append(session)
-                cli.register_session(self.sessions[-1])
-        except OSError as exc:
-            if exc.errno == errno.EAGAIN: pass
+            conn, addr = self.socket.accept()
+        except OSError: # EAGAIN, nothing pending
+            return
+        if not self.free:
+            self.rejected += 1
+            conn.close()
+            return
+        client_ip, port = addr[:2]
+        session = self.free.pop()
+        session.attach(client_ip, port, stream(conn))
+        session.set_timeouts(*self.timeouts)
+        self.sessions.append(session)
+        cli.register_session(session)
+
+    def release(self, session):
+        # returns closed client session to the pool
+        if session in self.sessions:
+            self.sessions.remove(session)
+            session.socket = None
+            self.free.append(session)
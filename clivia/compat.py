@@ -0,0 +1,197 @@
+"""
+Platform layer of Clivia, the same modules run on MicroPython boards and on
+CPython hosts (for soak tests and benchmarks off-device).
+
+MicroPython modules are used where they exist, otherwise their standard
+counterparts with the few differences Clivia depends on filled in: poll
+reports registered objects instead of file descriptors, sockets have
+readinto/write, asyncio can read any session stream, time has ticks_* and
+const is a no-op.
+"""
+
+import sys
+import gc
+
+MICROPYTHON = sys.implementation.name == 'micropython'
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+try:
+    isfuture = asyncio.isfuture
+except AttributeError:
+    def isfuture(obj):
+        # uasyncio awaitables only work inside their own asyncio task, handlers cannot yield them
+        return False
+
+try:
+    import uheapq as heapq
+except ImportError:
+    import heapq
+
+try:
+    from ucollections import OrderedDict, namedtuple
+except ImportError:
+    from collections import OrderedDict, namedtuple
+
+try:
+    from micropython import const
+except ImportError:
+    def const(value):
+        return value
+
+try:
+    from uarray import array
+except ImportError:
+    from array import array
+
+try:
+    from time import ticks_ms, ticks_us, ticks_diff
+except ImportError:
+    # CPython: monotonic and never wrapping, so plain arithmetic does
+    from time import perf_counter_ns
+
+    def ticks_ms():
+        return perf_counter_ns() // 1000000
+
+    def ticks_us():
+        return perf_counter_ns() // 1000
+
+    def ticks_diff(end, start):
+        return end - start
+
+try:
+    print_exception = sys.print_exception
+except AttributeError:
+    def print_exception(exc, file=sys.stdout):
+        import traceback
+        traceback.print_exception(type(exc), exc, exc.__traceback__, file=file)
+
+try:
+    mem_free = gc.mem_free
+except AttributeError:
+    def mem_free():
+        # hosts are not short of memory, nothing is ever unloaded
+        return sys.maxsize
+
+try:
+    import uselect as select
+except ImportError:
+    import select as _select
+
+    class _Poll:
+        # select.poll reporting registered objects like uselect.poll
+        def __init__(self):
+            self.poller = _select.poll()
+            self.objects = {}
+
+        def register(self, obj, eventmask=_select.POLLIN | _select.POLLOUT):
+            fd = obj.fileno()
+            self.objects[fd] = obj
+            self.poller.register(fd, eventmask)
+
+        def modify(self, obj, eventmask):
+            self.poller.modify(obj.fileno(), eventmask)
+
+        def unregister(self, obj):
+            # closed objects have no file descriptor any more, so look it up
+            for fd, registered in self.objects.items():
+                if registered is obj:
+                    del self.objects[fd]
+                    self.poller.unregister(fd)
+                    return
+
+        def poll(self, timeout=-1):
+            objects = self.objects
+            return [(objects[fd], event) for fd, event in self.poller.poll(timeout) if fd in objects]
+
+    class select:
+        POLLIN = _select.POLLIN
+        POLLOUT = _select.POLLOUT
+        POLLHUP = _select.POLLHUP
+        POLLERR = _select.POLLERR
+        poll = _Poll
+
+
+class SocketStream:
+    # CPython socket with readinto/write of a MicroPython one, both return None when they would block
+    def __init__(self, sock):
+        self.sock = sock
+
+    def __getattr__(self, name):
+        return getattr(self.sock, name)
+
+    def readinto(self, buf):
+        try:
+            return self.sock.recv_into(buf)
+        except BlockingIOError:
+            return None
+
+    def write(self, data):
+        try:
+            return self.sock.send(data)
+        except BlockingIOError:
+            return None
+
+
+def write_buffer_size(writer):
+    # bytes queued in asyncio stream writer and not sent yet
+    if MICROPYTHON:
+        return len(writer.out_buf)
+    return writer.transport.get_write_buffer_size()
+
+
+def stream(sock):
+    # socket usable as a session stream on this platform
+    return sock if MICROPYTHON else SocketStream(sock)
+
+
+class FillReader:
+    # readline/readexactly of an asyncio stream over fill(buf), which reads without blocking like
+    # CliviaSession.fill, polled while nothing is available
+    POLL_S = 0.005
+
+    def __init__(self, fill, size=256):
+        self.fill = fill
+        self.chunk = bytearray(size)
+        self.buf = bytearray()
+        self.eof = False
+
+    async def more(self):
+        # appends next bytes to buf, False on EOF
+        while not self.eof:
+            n = self.fill(memoryview(self.chunk))
+            if n is None:
+                await asyncio.sleep(self.POLL_S)
+            elif n == 0:
+                self.eof = True
+            else:
+                self.buf += self.chunk[:n]
+                return True
+        return False
+
+    def take(self, n):
+        data = bytes(self.buf[:n])
+        del self.buf[:n]
+        return data
+
+    async def readline(self):
+        while True:
+            i = self.buf.find(b'\n')
+            if i >= 0:
+                return self.take(i + 1)
+            if not await self.more():
+                return self.take(len(self.buf))
+
+    async def readexactly(self, n):
+        while len(self.buf) < n:
+            if not await self.more():
+                raise EOFError
+        return self.take(n)
+
+
+def async_reader(stdin, fill):
+    # asyncio reader of a session input, CPython has no StreamReader over a plain stream
+    return asyncio.StreamReader(stdin) if MICROPYTHON else FillReader(fill)
@@ -0,0 +1,70 @@
+"""
+Cron-like schedules for Clivia jobs: 'minute hour day month weekday'.
+"""
+
+import time
+
+# (lowest, highest) value of every field, weekday 7 is sunday like 0
+_FIELDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+
+def _parse_field(text, lo, hi):
+    # '*', 'n', 'a-b', with optional '/step', comma separated, returns bit mask of values
+    mask = 0
+    for part in text.split(','):
+        step = 1
+        if '/' in part:
+            part, step = part.split('/')
+            step = int(step)
+        if part == '*':
+            a, b = lo, hi
+        elif '-' in part:
+            a, b = part.split('-')
+            a, b = int(a), int(b)
+        else:
+            a = int(part)
+            b = hi if step > 1 else a
+        if a < lo or b > hi or a > b or step < 1:
+            raise ValueError("field out of range: %s" % text)
+        for v in range(a, b + 1, step):
+            mask |= 1 << v
+    return mask
+
+
+class CronSchedule:
+    def __init__(self, spec):
+        fields = spec.split()
+        if len(fields) != 5:
+            raise ValueError("expecting 5 fields: minute hour day month weekday")
+        self.spec = ' '.join(fields)
+        self.masks = [_parse_field(f, lo, hi) for f, (lo, hi) in zip(fields, _FIELDS)]
+        if self.masks[4] & (1 << 7):
+            self.masks[4] |= 1
+        # like cron, day and weekday match either one when both are restricted
+        self.any_day = fields[2] != '*' and fields[4] != '*'
+
+    def match_day(self, tm):
+        day = self.masks[2] >> tm[2] & 1
+        weekday = self.masks[4] >> ((tm[6] + 1) % 7) & 1 # localtime weekday 0 is monday
+        return (day or weekday) if self.any_day else (day and weekday)
+
+    def next(self, t):
+        # first whole minute after t (seconds since epoch, local time) matching the schedule
+        t = int(t) // 60 * 60 + 60
+        minute, hour, _, month, _ = self.masks
+        for _ in range(4 * 366 * 25):
+            tm = time.localtime(t)
+            if not (month >> tm[1] & 1 and self.match_day(tm)):
+                t += 86400 - tm[3] * 3600 - tm[4] * 60
+            elif not hour >> tm[3] & 1:
+                t += 3600 - tm[4] * 60
+            elif not minute >> tm[4] & 1:
+                t += 60
+            else:
+                return t
+        raise ValueError("schedule never matches: %s" % self.spec)
+
+    def delay_ms(self):
+        # milliseconds from now to the next match
+        now = time.time()
+        return int((self.next(now) - now) * 1000)
@@ -0,0 +1,199 @@
+"""
+Length-prefixed binary frames for machine-to-machine Clivia sessions.
+
+Every frame is a 2 byte big-endian payload length followed by the payload,
+a single value in MessagePack format (nil, bool, int, float, str, bin, array
+and map), so hosts may use any MessagePack library to talk to the board.
+
+Request:  [command, args], command is its id (see Clivia.command_ids) or its
+          name, args a map of destinations to values, an array of words to
+          parse like a text command line, or nil for defaults
+Response: [kind, value], see KIND_*
+Keepalive: nil, sent by the board while the session is idle, see
+           CliviaSession.set_timeouts
+"""
+
+import struct
+
+HEADER_SIZE = 2
+MAX_PAYLOAD = 0xffff
+
+KIND_RESULT = 0  # value returned by handler, last frame of a response
+KIND_OUTPUT = 1  # text printed by handler
+KIND_ERROR = 2   # command failed, last frame of a response
+
+
+def length(data):
+    # payload length from the first HEADER_SIZE bytes of data
+    return data[0] << 8 | data[1]
+
+
+def message(value):
+    # complete frame of value, header included
+    buf = bytearray(HEADER_SIZE)
+    _pack(value, buf)
+    n = len(buf) - HEADER_SIZE
+    if n > MAX_PAYLOAD:
+        raise ValueError("frame too large")
+    buf[0] = n >> 8
+    buf[1] = n & 0xff
+    return buf
+
+
+def pack(value):
+    buf = bytearray()
+    _pack(value, buf)
+    return buf
+
+
+def _pack(value, buf):
+    if value is None:
+        buf.append(0xc0)
+    elif value is True:
+        buf.append(0xc3)
+    elif value is False:
+        buf.append(0xc2)
+    elif isinstance(value, int):
+        if 0 <= value < 0x80:
+            buf.append(value)
+        elif -32 <= value < 0:
+            buf.append(value & 0xff)
+        elif value >= 0:
+            if value < 0x100:
+                buf += struct.pack('>BB', 0xcc, value)
+            elif value < 0x10000:
+                buf += struct.pack('>BH', 0xcd, value)
+            elif value < 0x100000000:
+                buf += struct.pack('>BI', 0xce, value)
+            else:
+                buf += struct.pack('>BQ', 0xcf, value)
+        elif value >= -0x80:
+            buf += struct.pack('>Bb', 0xd0, value)
+        elif value >= -0x8000:
+            buf += struct.pack('>Bh', 0xd1, value)
+        elif value >= -0x80000000:
+            buf += struct.pack('>Bi', 0xd2, value)
+        else:
+            buf += struct.pack('>Bq', 0xd3, value)
+    elif isinstance(value, float):
+        buf += struct.pack('>Bd', 0xcb, value)
+    elif isinstance(value, str):
+        data = value.encode('utf-8')
+        n = len(data)
+        if n < 32:
+            buf.append(0xa0 | n)
+        elif n < 0x100:
+            buf += struct.pack('>BB', 0xd9, n)
+        else:
+            buf += struct.pack('>BH', 0xda, n)
+        buf += data
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        n = len(value)
+        if n < 0x100:
+            buf += struct.pack('>BB', 0xc4, n)
+        else:
+            buf += struct.pack('>BH', 0xc5, n)
+        buf += value
+    elif isinstance(value, (list, tuple)):
+        n = len(value)
+        if n < 16:
+            buf.append(0x90 | n)
+        else:
+            buf += struct.pack('>BH', 0xdc, n)
+        for item in value:
+            _pack(item, buf)
+    elif isinstance(value, dict):
+        n = len(value)
+        if n < 16:
+            buf.append(0x80 | n)
+        else:
+            buf += struct.pack('>BH', 0xde, n)
+        for key, item in value.items():
+            _pack(key, buf)
+            _pack(item, buf)
+    else:
+        _pack(str(value), buf)
+
+
+# fixed size types: first byte: (struct format, size)
+_FIXED = {
+    0xcc: ('>B', 1), 0xcd: ('>H', 2), 0xce: ('>I', 4), 0xcf: ('>Q', 8),
+    0xd0: ('>b', 1), 0xd1: ('>h', 2), 0xd2: ('>i', 4), 0xd3: ('>q', 8),
+    0xca: ('>f', 4), 0xcb: ('>d', 8),
+}
+
+# first byte: size of length that follows
+_LENGTH = {0xd9: 1, 0xda: 2, 0xdb: 4, 0xc4: 1, 0xc5: 2, 0xc6: 4, 0xdc: 2, 0xdd: 4, 0xde: 2, 0xdf: 4}
+
+
+def unpack(data):
+    # value of payload, raises ValueError when it is malformed or truncated
+    try:
+        value, i = _unpack(memoryview(data), 0)
+    except IndexError: # bounds are checked before every struct read, MicroPython has no struct.error
+        raise ValueError("truncated frame")
+    if i != len(data):
+        raise ValueError("trailing bytes in frame")
+    return value
+
+
+def _unpack(data, i):
+    b = data[i]
+    i += 1
+    if b < 0x80:
+        return b, i
+    if b >= 0xe0:
+        return b - 0x100, i
+    if b < 0x90:
+        return _unpack_map(data, i, b & 0x0f)
+    if b < 0xa0:
+        return _unpack_array(data, i, b & 0x0f)
+    if b < 0xc0:
+        return _unpack_str(data, i, b & 0x1f)
+    if b == 0xc0:
+        return None, i
+    if b == 0xc2:
+        return False, i
+    if b == 0xc3:
+        return True, i
+    fixed = _FIXED.get(b)
+    if fixed is not None:
+        if i + fixed[1] > len(data):
+            raise IndexError
+        return struct.unpack_from(fixed[0], data, i)[0], i + fixed[1]
+    size = _LENGTH.get(b)
+    if size is None:
+        raise ValueError("unsupported type 0x%02x" % b)
+    if i + size > len(data):
+        raise IndexError
+    n = data[i] if size == 1 else struct.unpack_from('>H' if size == 2 else '>I', data, i)[0]
+    i += size
+    if b >= 0xdc:
+        return (_unpack_array if b < 0xde else _unpack_map)(data, i, n)
+    if b >= 0xd9:
+        return _unpack_str(data, i, n)
+    if i + n > len(data):
+        raise IndexError
+    return bytes(data[i:i + n]), i + n
+
+
+def _unpack_str(data, i, n):
+    if i + n > len(data):
+        raise IndexError
+    return str(bytes(data[i:i + n]), 'utf-8'), i + n
+
+
+def _unpack_array(data, i, n):
+    items = []
+    for _ in range(n):
+        item, i = _unpack(data, i)
+        items.append(item)
+    return items, i
+
+
+def _unpack_map(data, i, n):
+    items = {}
+    for _ in range(n):
+        key, i = _unpack(data, i)
+        items[key], i = _unpack(data, i)
+    return items, i
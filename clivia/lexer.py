@@ -0,0 +1,146 @@
+"""
+Single pass splitter for Clivia command lines.
+
+Gives the same tokens as shlex.split(line) (posix mode, no comments): words
+separated by whitespace, single quotes, double quotes, backslash escapes.
+Redirect operator '>' is an ordinary word, as it is for shlex.
+
+Byte level loops (line framing of received bytes, word bounds of plain
+command lines, hashing and comparing lines) are compiled with the viper
+emitter where MicroPython has it, see lexer_viper. None of them allocates, so
+lines can stay memoryview slices of a receive buffer until their words are
+needed as strings. CPython and ports without the emitter use builtins on
+copies instead, which still beat per byte Python loops.
+"""
+
+from compat import array
+
+_WHITESPACE = ' \t\r\n'
+_SPECIAL = ' \t\r\n\'"\\'
+
+MAX_WORDS = 64
+_bounds = array('H', [0] * (2 * MAX_WORDS)) # start, end offset of every word found by scan_words
+
+
+def _line_end(buf, start, end):
+    # index of first '\n' or Ctrl-C in buf[start:end], end if there is none
+    chunk = bytes(buf[start:end]) # MicroPython bytearray has no find
+    i = chunk.find(b'\n')
+    if i < 0:
+        i = len(chunk)
+    j = chunk.find(b'\x03', 0, i)
+    return start + (i if j < 0 else j)
+
+
+def _scan_words(buf, n, bounds, size):
+    return -1 # str.split of the decoded line is faster than a Python loop
+
+
+def _line_hash(buf, n):
+    return hash(bytes(buf[:n])) & 0x3fffffff
+
+
+def _same(buf, raw, n):
+    return 1 if bytes(buf[:n]) == raw[:n] else 0
+
+
+try:
+    from lexer_viper import line_end, scan_words, line_hash, same
+    VIPER = True
+except (ImportError, SyntaxError, AttributeError): # CPython, ports without the viper emitter
+    VIPER = False
+    line_end = _line_end
+    scan_words = _scan_words
+    line_hash = _line_hash
+    same = _same
+
+
+def split(line):
+    """Split the command *line* (str, bytes, bytearray or memoryview) into a list of tokens."""
+    if line is None:
+        raise ValueError("line argument must not be None")
+    if not isinstance(line, str):
+        count = scan_words(line, len(line), _bounds, MAX_WORDS)
+        if count >= 0:
+            # fast path: plain words only, strings are made of the words alone
+            b = _bounds
+            return [str(line[b[2 * k]:b[2 * k + 1]], 'utf-8') for k in range(count)]
+        line = str(line, 'utf-8')
+
+    if '"' not in line and "'" not in line and '\\' not in line:
+        # fast path: plain words only
+        if '\t' in line or '\r' in line or '\n' in line:
+            line = line.replace('\t', ' ').replace('\r', ' ').replace('\n', ' ')
+        return [word for word in line.split(' ') if word]
+
+    tokens = []
+    n = len(line)
+    i = 0
+    while i < n:
+        if line[i] in _WHITESPACE:
+            i += 1
+            continue
+
+        parts = []
+        while i < n:
+            c = line[i]
+            if c in _WHITESPACE:
+                break
+            elif c == "'":
+                j = line.find("'", i + 1)
+                if j < 0:
+                    raise ValueError("No closing quotation")
+                parts.append(line[i + 1:j])
+                i = j + 1
+            elif c == '"':
+                i = _double_quoted(line, i + 1, parts)
+            elif c == '\\':
+                if i + 1 >= n:
+                    raise ValueError("No escaped character")
+                parts.append(line[i + 1])
+                i += 2
+            else:
+                j = i + 1
+                while j < n and line[j] not in _SPECIAL:
+                    j += 1
+                parts.append(line[i:j])
+                i = j
+        tokens.append(''.join(parts))
+    return tokens
+
+
+def _double_quoted(line, i, parts):
+    # appends contents of double quoted string starting at line[i], returns index after closing quote
+    while True:
+        j = line.find('"', i)
+        if j < 0:
+            k = line.find('\\', i)
+            while k >= 0:
+                if k + 1 >= len(line):
+                    raise ValueError("No escaped character")
+                k = line.find('\\', k + 2)
+            raise ValueError("No closing quotation")
+        k = line.find('\\', i, j)
+        if k < 0:
+            parts.append(line[i:j])
+            return j + 1
+        parts.append(line[i:k])
+        c = line[k + 1]
+        if c == '"' or c == '\\':
+            parts.append(c)
+        else:
+            # only the quote and the escape character can be escaped within quotes
+            parts.append('\\' + c)
+        i = k + 2
+
+
+def quote(word):
+    """Return *word* quoted so that split() gives it back as one token."""
+    if word and not any(c in _SPECIAL for c in word):
+        return word
+    return "'" + word.replace("'", "'\"'\"'") + "'"
+
+
+def join(words):
+    """Inverse of split(): a command line that splits into *words*."""
+    return ' '.join(quote(word) for word in words)
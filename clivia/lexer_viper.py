@@ -0,0 +1,76 @@
+"""
+Byte level loops of lexer compiled with the viper emitter.
+
+The decorator must be spelled out as @micropython.viper, the compiler only
+recognises it so. Importing fails on CPython (no micropython module) and on
+MicroPython ports built without the emitter, lexer falls back to builtins then.
+"""
+
+import micropython
+
+
+@micropython.viper
+def line_end(buf, start: int, end: int) -> int:
+    # index of first '\n' or Ctrl-C in buf[start:end], end if there is none
+    p = ptr8(buf)
+    i = start
+    while i < end:
+        c = p[i]
+        if c == 10 or c == 3:
+            return i
+        i += 1
+    return end
+
+
+@micropython.viper
+def scan_words(buf, n: int, bounds, size: int) -> int:
+    # stores start and end offsets of whitespace separated words of buf[:n] in bounds, returns
+    # number of words, -1 when quotes or escapes need the full tokenizer, -2 when there are more than size
+    p = ptr8(buf)
+    b = ptr16(bounds)
+    count = 0
+    i = 0
+    while i < n:
+        c = p[i]
+        if c == 32 or c == 9 or c == 13 or c == 10:
+            i += 1
+            continue
+        start = i
+        while i < n:
+            c = p[i]
+            if c == 32 or c == 9 or c == 13 or c == 10:
+                break
+            if c == 34 or c == 39 or c == 92: # '"', "'", '\\'
+                return -1
+            i += 1
+        if count == size:
+            return -2
+        b[2 * count] = start
+        b[2 * count + 1] = i
+        count += 1
+    return count
+
+
+@micropython.viper
+def line_hash(buf, n: int) -> int:
+    # 30 bit rotate-xor hash of buf[:n], small int on every port
+    p = ptr8(buf)
+    h = 0
+    i = 0
+    while i < n:
+        h = ((h & 0x1ffffff) << 5 | h >> 25) ^ int(p[i])
+        i += 1
+    return h
+
+
+@micropython.viper
+def same(buf, raw, n: int) -> int:
+    # 1 if buf[:n] has the bytes of raw[:n], else 0
+    p = ptr8(buf)
+    r = ptr8(raw)
+    i = 0
+    while i < n:
+        if p[i] != r[i]:
+            return 0
+        i += 1
+    return 1
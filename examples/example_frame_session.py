@@ -0,0 +1,38 @@
+# file: example_frame_session.py
+# description: Example of machine-to-machine session speaking binary frames over UART
+# author: Damian Legutko (rustleofcicada@gmail.com)
+
+from clivia import Clivia, CliviaFrameSession
+from examples.load_commands import load_commands
+
+from machine import Pin, UART
+uart = UART(0, 115200, tx=Pin(0), rx=Pin(1))
+
+cli = Clivia()
+load_commands(cli)
+
+cli_frames = CliviaFrameSession('uart/frames', uart, uart)
+cli.register_session(cli_frames)
+
+with cli:
+    while True:
+        cli.loop()
+
+'''
+Every frame is 2 byte big-endian length and MessagePack payload, e.g. on the host:
+
+import msgpack, struct
+def request(command, args=None):
+    payload = msgpack.packb([command, args])
+    return struct.pack('>H', len(payload)) + payload
+
+request('led', {'state': 1, 'verbose': True})  # arguments by destination
+request('welcome', ['-q'])                     # or words parsed like text command line
+request('~commands')                           # map of command names to ids to call them by id
+
+Responses are [0, return value], [1, printed text] or [2, error message].
+'''
+
+# alternative:
+with cli:
+    cli.loop_forever()
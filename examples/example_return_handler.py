@@ -4,24 +4,25 @@
 
 import builtins
 from clivia import Clivia, CliviaUSB
-from load_commands import load_commands
+from examples.load_commands import load_commands
 
-# this function is optional
+# this function is optional, by default return value is printed to the output of the command
+# (or sent as result frame to framed sessions)
 def return_handler(retval, scope, print=builtins.print):
     if retval is not None:
         print(f"Command '{scope.cmd}' returned: {retval}")
         print(f"Function details:\nfunc: {scope.func}\nargs: {scope.args}\nkwargs: {scope.kwargs}")
 
-cli = Clivia(select_timeout = 0.5)
+cli = Clivia()
 load_commands(cli)
 
 cli_usb = CliviaUSB()
-cli_usb.return_handler = return_handler
-cli.mount(cli_usb)
+cli_usb.return_handler = return_handler # or cli.return_handler for all sessions
+cli.register_session(cli_usb)
 
 with cli:
     while True:
-        cli.loop() # will block for time specified in select_timeout
+        cli.loop()
 
 '''
 Now try following commands:
@@ -32,4 +33,4 @@ led 1 -v
 
 # alternative:
 with cli:
-    cli.loop_forever()
\ No newline at end of file
+    cli.loop_forever()
@@ -19,15 +19,17 @@ def on_client_connected(client_ip, client_port):
 cli = Clivia()
 load_commands(cli)
 
-tcps = CliviaTCPServer(ip, port)
+tcps = CliviaTCPServer(ip, port, max_clients=4)
+tcps.set_timeouts(idle_ms=600000, keepalive_ms=60000) # drop clients that vanished without closing
+cli.register_server(tcps)
+cli.add_job('welcome -q > tcps/*', interval_ms=60000) # greets all connected clients every minute
 #cli_tcps.on_new_client = on_client_connected
 
 print(f"Clivia TCP server starting on IP: {ip}")
 
 with cli:
     while True:
-        cli.loop()
-        tcps.accept_clients(cli)
+        cli.loop() # also accepts new TCP clients
 
 '''
 Connect via TCP connection and try following commands:
@@ -36,6 +38,6 @@ welcome -q
 led 1 -v
 '''
 
-# alternative:
+# alternative (asyncio, no busy loop):
 with cli:
     cli.loop_forever()
\ No newline at end of file
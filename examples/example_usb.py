@@ -20,6 +20,7 @@ Now try following commands on USB connection:
 help
 welcome -q
 led 1 -v
+welcome | grep Clivia
 ''' 
 
 # alternative:
@@ -17,9 +17,13 @@ load_commands(cli)
 cli_usb = CliviaUSB()
 cli.register_session(cli_usb)
 
-tcps = CliviaTCPServer(ip, port)
+tcps = CliviaTCPServer(ip, port, max_clients=4)
+cli.register_server(tcps)
 
 with cli:
     while True:
-        cli.loop()
-        tcps.accept_clients(cli)
+        cli.loop() # also accepts new TCP clients
+
+# alternative (asyncio, no busy loop):
+with cli:
+    cli.loop_forever()
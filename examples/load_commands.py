@@ -14,3 +14,13 @@ def load_commands(cli):
     p.add_argument("-q", "--quiet",   dest="quiet",   action="store_const", const=True, default=False)
     cli.add_command('welcome', your_code.print_welcome, p)
 
+    p = ap(prog='grep', description='Passes lines containing pattern')
+    p.add_argument('pattern', help='Text to look for')
+    cli.add_command('grep', your_code.grep, p, pass_stdin=True)
+
+    p = ap(prog='countdown', description='Counts down seconds without blocking other sessions')
+    p.add_argument('seconds', type=int, help='Seconds to count')
+    cli.add_command('countdown', your_code.countdown, p, timeout_ms=60000)
+
+    # lazy command: module is imported and parser built on first use
+    cli.add_command('blink', ('examples.your_lazy_code', 'blink_command'))
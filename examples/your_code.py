@@ -1,5 +1,6 @@
 import builtins
 from machine import Pin
+from clivia import Clivia
 
 led = Pin("LED", Pin.OUT)
 
@@ -19,3 +20,17 @@ def print_welcome(verbose=True, quiet=False, print=builtins.print) -> None:
 
     elif quiet:
         print("Welcome to Clivia.")
+
+async def grep(pattern, stdin, print=builtins.print):
+    # pipeline stage, e.g. `countdown 5 | grep 3`, lines are read as the previous command produces them
+    # async for waits with it, so other sessions are not blocked
+    async for line in stdin:
+        if pattern in str(line):
+            print(line)
+
+def countdown(seconds, print=builtins.print):
+    # long-running command, resumed on later ticks so other sessions are not blocked, Ctrl-C cancels it
+    for i in range(seconds, 0, -1):
+        yield str(i)
+        yield Clivia.sleep_ms(1000)
+    return 'liftoff'
@@ -0,0 +1,21 @@
+# this module is imported only when 'blink' command is used for the first time (see load_commands.py)
+import builtins
+from time import sleep_ms
+from machine import Pin
+from argparse import ArgumentParser
+
+led = Pin("LED", Pin.OUT)
+
+def blink(times, period, print=builtins.print) -> None:
+    for _ in range(times):
+        led.toggle()
+        sleep_ms(period)
+        led.toggle()
+        sleep_ms(period)
+    print(f"Blinked {times} times.")
+
+def blink_command():
+    p = ArgumentParser(prog='blink', description='Blinks an led')
+    p.add_argument('times', type=int, help='Number of blinks')
+    p.add_argument("-p", "--period", dest="period", type=int, default=250, help='Half period in ms')
+    return blink, p